@@ -1,5 +1,132 @@
+from math import ceil
+
 from django.contrib import admin
-from .models import User, Category, Listing, Bid, Comment
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.db.models.expressions import RawSQL
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+from .models import User, Category, Listing, Bid, ArchivedBid, ProxyBid, Comment
+from .search import match_expression, search_available, search_ids_sql
+
+
+# changelists over the big tables never count or offset past this many rows
+COUNT_LIMIT = 10000
+
+
+class ApproximatePaginator(Paginator):
+    # an unfiltered list is sized from the highest id, which SQLite reads
+    # off the end of the table. a filtered one is counted only up to
+    # COUNT_LIMIT. the page links stop there too, older rows are reached
+    # through the "older" link or the filters
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return queryset.aggregate(last=Max("pk"))["last"] or 0
+        return queryset.order_by()[:COUNT_LIMIT + 1].count()
+
+    @cached_property
+    def num_pages(self):
+        if self.count == 0 and not self.allow_empty_first_page:
+            return 0
+        rows = min(self.count, COUNT_LIMIT)
+        return max(1, ceil(max(1, rows - self.orphans) / self.per_page))
+
+
+class CursorChangeList(ChangeList):
+    def older_url(self):
+        # keyset step to the rows after this page, whatever page it is
+        if ORDER_VAR in self.params or len(self.result_list) < self.list_per_page:
+            return None
+        last = self.result_list[len(self.result_list) - 1]
+        return self.get_query_string({"before": last.pk}, [PAGE_VAR])
+
+
+class BeforeFilter(admin.SimpleListFilter):
+    # the cursor behind the "older" link, not shown in the sidebar
+    title = "position"
+    parameter_name = "before"
+    # the changelist only applies filters that have output
+    template = "admin/auctions/hidden_filter.html"
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        if not self.value().isdigit():
+            return queryset.none()
+        return queryset.filter(pk__lt=int(self.value()))
+
+
+class InputFilter(admin.SimpleListFilter):
+    # a text box instead of one link per row of the related table
+    template = "admin/auctions/input_filter.html"
+    lookup = None
+    numeric = False
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if self.numeric and not value.isdigit():
+            return queryset.none()
+        return queryset.filter(**{self.lookup: value})
+
+    def choices(self, changelist):
+        other = QueryDict(changelist.get_query_string(remove=[self.parameter_name, PAGE_VAR])[1:])
+        yield {
+            "value": self.value() or "",
+            "parameter_name": self.parameter_name,
+            "hidden": [(key, value) for key, values in other.lists() for value in values],
+            "clear": changelist.get_query_string(remove=[self.parameter_name, PAGE_VAR]),
+        }
+
+
+class SellerFilter(InputFilter):
+    title = "seller username"
+    parameter_name = "seller"
+    lookup = "user__username"
+
+
+class UserFilter(InputFilter):
+    title = "username"
+    parameter_name = "username"
+    lookup = "user__username"
+
+
+class ListingFilter(InputFilter):
+    title = "listing id"
+    parameter_name = "listing"
+    lookup = "auction_id"
+    numeric = True
+
+
+class HighVolumeAdmin(admin.ModelAdmin):
+    # for tables too big to count, list or load into a select
+    paginator = ApproximatePaginator
+    show_full_result_count = False
+    list_per_page = 50
+    change_list_template = "admin/auctions/high_volume_change_list.html"
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_list_filter(self, request):
+        return [*super().get_list_filter(request), BeforeFilter]
 
 
 @admin.register(Category)
@@ -9,25 +136,76 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Listing)
-class ListingAdmin(admin.ModelAdmin):
+class ListingAdmin(HighVolumeAdmin):
     list_display = ['title', 'user', 'category', 'starting_bid', 'current_price', 'is_active']
-    list_filter = ['is_active', 'category', 'user']
+    list_filter = ['is_active', 'category', SellerFilter]
+    list_select_related = ['user', 'category']
+    ordering = ['-id']
     search_fields = ['title', 'description']
-    readonly_fields = ['current_price']
+    readonly_fields = ['current_price', 'bid_count', 'top_bid', 'top_bidder', 'version', 'bids_archived']
+    autocomplete_fields = ['category']
+    raw_id_fields = ['user', 'winner', 'favoured']
+
+    def get_search_results(self, request, queryset, search_term):
+        # use the full-text index instead of LIKE '%...%' over both columns
+        if not search_available() or not match_expression(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        sql, params = search_ids_sql(search_term)
+        return queryset.filter(id__in=RawSQL(sql, params)), False
 
 
 @admin.register(Bid)
-class BidAdmin(admin.ModelAdmin):
+class BidAdmin(HighVolumeAdmin):
     list_display = ['amount', 'auction', 'user', 'timestamp']
-    list_filter = ['timestamp', 'auction']
-    search_fields = ['auction__title', 'user__username']
+    list_filter = [ListingFilter, UserFilter]
+    list_select_related = ['auction', 'user']
+    ordering = ['-id']
+    # exact, so a search is an index lookup rather than a scan of every bid
+    search_fields = ['=user__username']
     readonly_fields = ['timestamp']
+    autocomplete_fields = ['auction']
+    raw_id_fields = ['user']
+
+
+@admin.register(ProxyBid)
+class ProxyBidAdmin(HighVolumeAdmin):
+    # ceilings only change through auctions.bidding, which settles them
+    list_display = ['max_amount', 'auction', 'user', 'updated_on']
+    list_filter = [ListingFilter, UserFilter]
+    list_select_related = ['auction', 'user']
+    ordering = ['-id']
+    search_fields = ['=user__username']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedBid)
+class ArchivedBidAdmin(HighVolumeAdmin):
+    # written only by auctions.archive
+    list_display = ['amount', 'auction', 'user', 'timestamp']
+    list_filter = [ListingFilter, UserFilter]
+    list_select_related = ['auction', 'user']
+    ordering = ['-id']
+    search_fields = ['=user__username']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(HighVolumeAdmin):
     list_display = ['user', 'auction', 'created_on']
-    list_filter = ['created_on', 'auction']
-    search_fields = ['body', 'user__username', 'auction__title']
+    list_filter = [ListingFilter, UserFilter]
+    list_select_related = ['auction', 'user']
+    ordering = ['-id']
+    search_fields = ['body', '=user__username']
     readonly_fields = ['created_on']
-
+    autocomplete_fields = ['auction']
+    raw_id_fields = ['user']
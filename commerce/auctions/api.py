@@ -0,0 +1,117 @@
+import hashlib
+
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition, require_safe
+
+from .archive import bids_for
+from .models import Listing
+from .pagination import CursorPaginator, MergedCursorPaginator
+
+
+# everything is read through values() projections, no Listing or Bid
+# instances are built on the way to JSON
+LISTING_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "image_url": "image_url",
+    "current_price": "current_price",
+    "bid_count": "bid_count",
+    "ends_at": "ends_at",
+    "category": "category__slug",
+}
+DETAIL_FIELDS = {
+    **LISTING_FIELDS,
+    "description": "description",
+    "starting_bid": "starting_bid",
+    "seller": "user__username",
+    "is_active": "is_active",
+    "winner": "winner__username",
+}
+BID_FIELDS = {
+    "id": "id",
+    "amount": "amount",
+    "bidder": "user__username",
+    "timestamp": "timestamp",
+}
+LISTINGS_PER_PAGE = 20
+BIDS_PER_PAGE = 50
+
+
+def listing_etag(request, pk, **kwargs):
+    # a bid, edit or close bumps the version, so (id, version) names the
+    # listing's state and its bid history
+    version = Listing.objects.filter(pk=pk).values_list("version", flat=True).first()
+    return None if version is None else f"{pk}-{version}"
+
+
+@require_safe
+def listings(request):
+    # the (id, version) keys of the page are enough to answer a conditional
+    # GET, the rest of each row is only read when the page has changed
+    paginator = CursorPaginator(Listing.objects.open().values("id", "version"), LISTINGS_PER_PAGE)
+    page = paginator.page(request.GET.get("cursor"))
+    keys = ",".join(f"{row['id']}-{row['version']}" for row in page)
+    etag = quote_etag(hashlib.md5(f"{keys}|{page.next_cursor}".encode()).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    rows = _project(Listing.objects.filter(id__in=[row["id"] for row in page]), LISTING_FIELDS)
+    by_id = {row["id"]: row for row in rows}
+    response = JsonResponse({
+        "results": [by_id[row["id"]] for row in page if row["id"] in by_id],
+        "next": _page_url(request, page.next_cursor),
+        "previous": _page_url(request, page.previous_cursor),
+    })
+    response["ETag"] = etag
+    return response
+
+
+@require_safe
+@condition(etag_func=listing_etag)
+def listing_detail(request, pk):
+    fields = {**DETAIL_FIELDS, "top_bid": "top_bid", "top_bidder": "top_bidder__username"}
+    listing = next(iter(_project(Listing.objects.filter(pk=pk), fields)), None)
+    if listing is None:
+        raise Http404("No Listing matches the given query.")
+    top_bid, top_bidder = listing.pop("top_bid"), listing.pop("top_bidder")
+    listing["top_bid"] = {"amount": top_bid, "bidder": top_bidder} if top_bid is not None else None
+    return JsonResponse(listing)
+
+
+@require_safe
+@condition(etag_func=listing_etag)
+def listing_bids(request, pk):
+    state = Listing.objects.filter(pk=pk).values_list("is_active", "bids_archived").first()
+    if state is None:
+        raise Http404("No Listing matches the given query.")
+    # highest first, the same walk as the (auction, amount) index of either table
+    paginator = MergedCursorPaginator(
+        [bids.values(*BID_FIELDS.values()) for bids in bids_for(pk, *state)],
+        BIDS_PER_PAGE,
+        ordering=("-amount", "-id"),
+    )
+    page = paginator.page(request.GET.get("cursor"))
+    return JsonResponse({
+        "results": [_rename(row, BID_FIELDS) for row in page],
+        "next": _page_url(request, page.next_cursor),
+        "previous": _page_url(request, page.previous_cursor),
+    })
+
+
+def _project(queryset, fields):
+    return [_rename(row, fields) for row in queryset.values(*fields.values())]
+
+
+def _rename(row, fields):
+    return {name: row[lookup] for name, lookup in fields.items()}
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params["cursor"] = cursor
+    return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
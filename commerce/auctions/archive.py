@@ -0,0 +1,95 @@
+import time
+
+from django.db import connection, transaction
+
+from .models import ArchivedBid, Bid, Listing
+
+
+# columns moved as they are, so archived bids keep their ids and times
+COLUMNS = ("id", "amount", "timestamp", "user_id", "auction_id")
+
+
+def bids_for(listing_id, is_active, archived):
+    # the tables holding a listing's bids, to be read together. an open
+    # listing's are in Bid and an archived one's in ArchivedBid; a closed
+    # listing still being moved can have some in each
+    if archived:
+        return [ArchivedBid.objects.filter(auction_id=listing_id)]
+    if is_active:
+        return [Bid.objects.filter(auction_id=listing_id)]
+    return [Bid.objects.filter(auction_id=listing_id), ArchivedBid.objects.filter(auction_id=listing_id)]
+
+
+def archive_closed_bids(batch_size=5000, pause=0.0):
+    # moves the bids of closed listings to ArchivedBid in transactions of
+    # about batch_size bids, so the write lock is only held briefly. small
+    # listings go whole, several at a time; a listing with more bids than
+    # that goes in id ranges and is marked archived with its last range.
+    # `pause` leaves room for bids between chunks
+    moved = listings = 0
+    last_id = 0
+    pending = Listing.objects.filter(is_active=False, bids_archived=False)
+    while True:
+        candidates = list(pending.filter(id__gt=last_id).order_by("id").values_list("id", "bid_count")[:batch_size])
+        if not candidates:
+            return moved, listings
+        chunk, size = [], 0
+        for pk, bid_count in candidates:
+            if chunk and size + bid_count > batch_size:
+                break
+            chunk.append(pk)
+            size += bid_count
+        last_id = chunk[-1]
+        if size > batch_size:
+            chunk_moved, chunk_listings = _archive_listing_in_ranges(chunk[0], batch_size, pause)
+        else:
+            chunk_moved, chunk_listings = _archive_listings(chunk)
+        moved += chunk_moved
+        listings += chunk_listings
+        if pause:
+            time.sleep(pause)
+
+
+def _archive_listings(listing_ids):
+    with transaction.atomic():
+        # checked again under the write lock, in case one was reopened
+        ids = list(Listing.objects.filter(
+            pk__in=listing_ids, is_active=False, bids_archived=False,
+        ).values_list("id", flat=True))
+        if not ids:
+            return 0, 0
+        moved = _move_bids(f"auction_id IN ({', '.join(['%s'] * len(ids))})", ids)
+        Listing.objects.filter(pk__in=ids).update(bids_archived=True)
+    return moved, len(ids)
+
+
+def _archive_listing_in_ranges(listing_id, batch_size, pause):
+    # readers see the listing as closed but not archived meanwhile, and
+    # read both tables (bids_for)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            if not Listing.objects.filter(pk=listing_id, is_active=False, bids_archived=False).exists():
+                return moved, 0
+            bounds = list(
+                Bid.objects.filter(auction_id=listing_id).order_by("id").values_list("id", flat=True)[batch_size - 1:batch_size]
+            )
+            if not bounds:
+                moved += _move_bids("auction_id = %s", [listing_id])
+                Listing.objects.filter(pk=listing_id).update(bids_archived=True)
+                return moved, 1
+            moved += _move_bids("auction_id = %s AND id <= %s", [listing_id, bounds[0]])
+        if pause:
+            time.sleep(pause)
+
+
+def _move_bids(where, params):
+    columns = ", ".join(COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {ArchivedBid._meta.db_table} ({columns}) "
+            f"SELECT {columns} FROM {Bid._meta.db_table} WHERE {where}",
+            params,
+        )
+        cursor.execute(f"DELETE FROM {Bid._meta.db_table} WHERE {where}", params)
+        return cursor.rowcount
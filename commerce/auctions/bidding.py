@@ -0,0 +1,143 @@
+from concurrent import futures
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .events import publish_bid
+from .page_cache import purge_listing
+from .models import Listing, Bid, ProxyBid
+
+
+BID_INCREMENT = Decimal("0.01")
+SEQUENCER_TIMEOUT = 10
+
+
+class BidRejected(Exception):
+    def __init__(self, message, current_price=None):
+        super().__init__(message)
+        self.current_price = current_price
+
+    @classmethod
+    def closed(cls):
+        return cls("this auction is closed")
+
+    @classmethod
+    def busy(cls):
+        return cls("bidding on this auction is busy, please try again")
+
+    @classmethod
+    def outbid(cls, current_price):
+        return cls(f"you were outbid, you must bid higher than ${current_price}", current_price=current_price)
+
+
+def minimum_bid(current_price):
+    return current_price + BID_INCREMENT
+
+
+def place_bid(auction_id, user, amount):
+    # the conditional update is the only check that counts: whoever gets the
+    # row lock first wins, everyone else sees zero rows updated and is outbid
+    with transaction.atomic():
+        updated = Listing.objects.open().filter(
+            pk=auction_id, current_price__lt=amount
+        ).update(
+            current_price=amount, top_bid=amount, top_bidder=user,
+            bid_count=F("bid_count") + 1, version=F("version") + 1,
+        )
+        if updated:
+            bid = Bid.objects.create(amount=amount, user=user, auction_id=auction_id)
+            purge_listing(auction_id)
+            transaction.on_commit(lambda: publish_bid(bid))
+            # a higher ceiling answers straight away
+            resolve_proxies(auction_id, amount, user.pk)
+            return bid
+
+    # one read to explain the rejection, no retry
+    state = Listing.objects.open().filter(pk=auction_id).values("current_price").first()
+    if state is None:
+        raise BidRejected.closed()
+    raise BidRejected.outbid(state["current_price"])
+
+
+def set_proxy_bid(auction_id, user, maximum):
+    # registers or raises the user's ceiling and settles every ceiling on the
+    # listing in one step. returns the resulting Bid, if the price moved
+    with transaction.atomic():
+        state = Listing.objects.open().filter(pk=auction_id).values("current_price", "top_bidder").first()
+        if state is None:
+            raise BidRejected.closed()
+        if maximum < minimum_bid(state["current_price"]):
+            raise BidRejected.outbid(state["current_price"])
+        proxy = ProxyBid.objects.filter(auction_id=auction_id, user=user).first()
+        if proxy is not None and maximum <= proxy.max_amount:
+            raise BidRejected(f"your maximum is already ${proxy.max_amount}")
+        ProxyBid.objects.update_or_create(auction_id=auction_id, user=user, defaults={"max_amount": maximum})
+        return resolve_proxies(auction_id, state["current_price"], state["top_bidder"])
+
+
+def resolve_proxies(auction_id, price, top_bidder_id):
+    # the highest ceiling leads at the second highest plus one increment
+    # (or just enough to beat the standing bid), capped at its own ceiling.
+    # only the top two ceilings matter, so this is one indexed read and at
+    # most one Bid, however many proxies are competing. call it inside the
+    # transaction that set `price`
+    ceilings = list(
+        ProxyBid.objects.filter(auction_id=auction_id)
+        .order_by("-max_amount", "updated_on")
+        .values_list("user", "max_amount")[:2]
+    )
+    if not ceilings:
+        return None
+    leader, ceiling = ceilings[0]
+    floor = price if leader == top_bidder_id else minimum_bid(price)
+    if ceiling < floor:
+        # an ordinary bid has gone past every ceiling
+        return None
+    if len(ceilings) > 1:
+        floor = max(floor, minimum_bid(ceilings[1][1]))
+    new_price = min(ceiling, floor)
+    if leader == top_bidder_id and new_price == price:
+        return None
+
+    Listing.objects.filter(pk=auction_id).update(
+        current_price=new_price, top_bid=new_price, top_bidder=leader,
+        bid_count=F("bid_count") + 1, version=F("version") + 1,
+    )
+    bid = Bid.objects.create(amount=new_price, user_id=leader, auction_id=auction_id)
+    purge_listing(auction_id)
+    transaction.on_commit(lambda: publish_bid(bid))
+    return bid
+
+
+def submit_bid(auction_id, user, amount):
+    # hot listings can opt into the single-writer sequencer, see sequencer.py
+    if settings.AUCTIONS_BID_SEQUENCER:
+        from .sequencer import get_sequencer
+        future = get_sequencer().submit(auction_id, user, amount)
+        try:
+            return future.result(timeout=SEQUENCER_TIMEOUT)
+        except futures.TimeoutError:
+            # withdraw it while still queued, so it cannot commit after the
+            # bidder was told it failed. once a worker has it, wait it out
+            if future.cancel():
+                raise BidRejected.busy() from None
+            return future.result()
+    return place_bid(auction_id, user, amount)
+
+
+def recompute_bid_summary(listings):
+    # rebuild the summary fields from the Bid rows in one UPDATE, for bulk
+    # loads that insert bids without going through place_bid. listings
+    # whose bids are archived already have their final summary
+    bids = Bid.objects.filter(auction=OuterRef("pk"))
+    top = bids.order_by("-amount", "id")
+    listings.filter(bids_archived=False).update(
+        bid_count=Coalesce(Subquery(bids.values("auction").annotate(n=Count("id")).values("n")), 0),
+        top_bid=Subquery(top.values("amount")[:1]),
+        top_bidder=Subquery(top.values("user")[:1]),
+        current_price=Coalesce(Subquery(top.values("amount")[:1]), F("starting_bid")),
+        version=F("version") + 1,
+    )
@@ -0,0 +1,36 @@
+import threading
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from .models import Category
+
+
+VERSION_KEY = "auctions:categories:version"
+
+CategoryEntry = namedtuple("CategoryEntry", ["id", "name", "slug"])
+
+_lock = threading.Lock()
+_registry = (None, ())
+
+
+def categories_version():
+    # the version lives in the shared cache so a change made by one worker
+    # is seen by all of them; a random token survives cache eviction safely
+    return cache.get_or_set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_categories():
+    global _registry
+    version = categories_version()
+    if _registry[0] != version:
+        with _lock:
+            if _registry[0] != version:
+                rows = Category.objects.order_by("name").values_list("id", "name", "slug")
+                _registry = (version, tuple(CategoryEntry(*row) for row in rows))
+    return _registry[1]
+
+
+def invalidate_categories():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
@@ -0,0 +1,26 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Listing
+from .pagination import CursorPaginator
+
+
+COMMENTS_PER_PAGE = 20
+
+
+def comments_page(listing_id, cursor=None):
+    # newest first with their authors joined in, walking
+    # comment_auction_created_idx; later pages come from the fragment view
+    paginator = CursorPaginator(
+        Comment.objects.filter(auction_id=listing_id).select_related("user"),
+        COMMENTS_PER_PAGE,
+        ordering=("-created_on", "-id"),
+    )
+    return paginator.page(cursor)
+
+
+def recount_comments(listings=None):
+    # rebuild comment_count from the Comment rows, for bulk loads that bypass signals
+    listings = Listing.objects.all() if listings is None else listings
+    comments = Comment.objects.filter(auction=OuterRef("pk")).values("auction").annotate(n=Count("id")).values("n")
+    listings.update(comment_count=Coalesce(Subquery(comments), 0))
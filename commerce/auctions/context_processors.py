@@ -1,6 +1,7 @@
-from .models import Category
+from .categories import get_categories
+
+
 def categories_processor(request):
-    
     return {
-        'all_categories': Category.objects.all().order_by('name')
+        'all_categories': get_categories()
     }
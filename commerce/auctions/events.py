@@ -0,0 +1,132 @@
+import asyncio
+import json
+import threading
+from collections import OrderedDict, defaultdict, deque, namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+Event = namedtuple("Event", ["id", "type", "data", "sse"])
+
+
+class Subscriber:
+    # one per open stream or pending long-poll. lives on the event loop that
+    # created it and is only ever touched from that loop
+    __slots__ = ("loop", "pending", "waiter")
+
+    def __init__(self, loop, backlog):
+        self.loop = loop
+        # every event carries the listing's full state, so a slow client
+        # losing old events to the maxlen only ever skips stale prices
+        self.pending = deque(maxlen=backlog)
+        self.waiter = None
+
+    def deliver(self, event):
+        self.pending.append(event)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self, timeout=None):
+        while not self.pending:
+            self.waiter = self.loop.create_future()
+            try:
+                await asyncio.wait_for(self.waiter, timeout)
+            finally:
+                self.waiter = None
+        return self.pending.popleft()
+
+
+class EventHub:
+    # in-process publish/subscribe keyed by listing id. an event is encoded
+    # once and the same bytes are handed to every subscriber, one
+    # call_soon_threadsafe per event loop rather than per subscriber
+
+    def __init__(self, backlog=8, remember=10000):
+        self.backlog = backlog
+        self.remember = remember
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._latest = OrderedDict()
+        self._sequence = 0
+
+    def subscribe(self, listing_id):
+        subscriber = Subscriber(asyncio.get_running_loop(), self.backlog)
+        with self._lock:
+            self._subscribers[listing_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, listing_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(listing_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[listing_id]
+
+    def publish(self, listing_id, event_type, data):
+        payload = json.dumps(data, cls=DjangoJSONEncoder)
+        with self._lock:
+            self._sequence += 1
+            event = Event(
+                self._sequence, event_type, payload,
+                f"id: {self._sequence}\nevent: {event_type}\ndata: {payload}\n\n".encode(),
+            )
+            # the last event per listing answers long-polls that arrive late
+            self._latest[listing_id] = event
+            self._latest.move_to_end(listing_id)
+            if len(self._latest) > self.remember:
+                self._latest.popitem(last=False)
+            subscribers = tuple(self._subscribers.get(listing_id, ()))
+
+        by_loop = defaultdict(list)
+        for subscriber in subscribers:
+            by_loop[subscriber.loop].append(subscriber)
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_fan_out, group, event)
+            except RuntimeError:
+                # the loop has shut down, its subscribers are gone with it
+                pass
+        return event
+
+    def latest(self, listing_id):
+        with self._lock:
+            return self._latest.get(listing_id)
+
+    def subscriber_count(self, listing_id=None):
+        with self._lock:
+            if listing_id is not None:
+                return len(self._subscribers.get(listing_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def _fan_out(subscribers, event):
+    for subscriber in subscribers:
+        subscriber.deliver(event)
+
+
+hub = EventHub()
+
+
+def last_event_id(listing_id):
+    latest = hub.latest(listing_id)
+    return latest.id if latest else 0
+
+
+def snapshot_event(event_id, state):
+    # not published, just sent first on every new stream. event_id is the
+    # last event the state is known to include
+    payload = json.dumps(state, cls=DjangoJSONEncoder)
+    return Event(event_id, "snapshot", payload, f"id: {event_id}\nevent: snapshot\ndata: {payload}\n\n".encode())
+
+
+def publish_bid(bid):
+    hub.publish(bid.auction_id, "bid", {
+        "price": bid.amount,
+        "bidder": bid.user.username,
+        "timestamp": bid.timestamp,
+    })
+
+
+def publish_closed(listing_id, winner=None):
+    hub.publish(listing_id, "closed", {"winner": winner})
@@ -0,0 +1,96 @@
+import heapq
+import logging
+import threading
+from datetime import timedelta
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import publish_closed
+from .page_cache import purge_listings
+from .models import Listing
+
+
+logger = logging.getLogger(__name__)
+
+
+def close_expired_auctions(now=None):
+    # one UPDATE closes every auction past its deadline and hands it to the
+    # leading bidder, which the bid summary already knows
+    now = now or timezone.now()
+    due = Listing.objects.filter(is_active=True, ends_at__lte=now)
+    with transaction.atomic():
+        # the transaction holds the write lock, so the UPDATE closes exactly
+        # the rows read here
+        expired = list(due.values_list("id", "top_bidder__username"))
+        if expired:
+            due.update(is_active=False, winner=F("top_bidder"), version=F("version") + 1)
+            transaction.on_commit(partial(_announce_closed, expired))
+            purge_listings(pk for pk, _ in expired)
+    return [pk for pk, _ in expired]
+
+
+def _announce_closed(expired):
+    for pk, winner in expired:
+        publish_closed(pk, winner)
+
+
+class ExpiryScheduler:
+    # keeps the deadlines coming up within `horizon` in a heap and sleeps
+    # until the earliest one. the heap is reloaded every `refresh` so new
+    # listings and edited deadlines are picked up
+
+    def __init__(self, horizon=timedelta(hours=1), refresh=timedelta(seconds=60)):
+        self.horizon = horizon
+        self.refresh = refresh
+        self.deadlines = []
+        self.loaded_at = None
+        self._stop = threading.Event()
+
+    def load(self, now=None):
+        now = now or timezone.now()
+        self.deadlines = list(
+            Listing.objects.filter(is_active=True, ends_at__lte=now + self.horizon)
+            .order_by("ends_at")
+            .values_list("ends_at", "id")
+        )
+        heapq.heapify(self.deadlines)
+        self.loaded_at = now
+
+    def next_wakeup(self, now):
+        wakeup = self.loaded_at + self.refresh
+        if self.deadlines:
+            wakeup = min(wakeup, self.deadlines[0][0])
+        return max(wakeup, now)
+
+    def tick(self, now=None):
+        now = now or timezone.now()
+        if self.loaded_at is None or now >= self.loaded_at + self.refresh:
+            self.load(now)
+        closed = []
+        if self.deadlines and self.deadlines[0][0] <= now:
+            while self.deadlines and self.deadlines[0][0] <= now:
+                heapq.heappop(self.deadlines)
+            closed = close_expired_auctions(now)
+            if closed:
+                logger.info("closed %d expired auctions", len(closed))
+        return closed
+
+    def run(self):
+        try:
+            while not self._stop.is_set():
+                self.tick()
+                now = timezone.now()
+                self._stop.wait((self.next_wakeup(now) - now).total_seconds())
+        finally:
+            connection.close()
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="auction-expiry", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
@@ -1,5 +1,11 @@
+from datetime import timedelta
+
 from django import forms
-from .models import Listing, Category, Bid, Comment
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from .models import Listing, Category, Bid, ProxyBid, Comment
 
 
 class NewAuctionForm(forms.ModelForm):
@@ -11,21 +17,49 @@ class NewAuctionForm(forms.ModelForm):
         }),
         label='url of image(optional)'
     )
+    duration = forms.TypedChoiceField(
+        choices=[
+            ('', 'No end time (close it yourself)'),
+            (1, '1 day'),
+            (3, '3 days'),
+            (7, '7 days'),
+            (14, '14 days'),
+        ],
+        coerce=int,
+        empty_value=None,
+        required=False,
+        widget=forms.Select(attrs={'class': 'browser-default'}),
+        label='auction length',
+    )
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['category'].empty_label = "Select a category"
         self.fields['category'].queryset = Category.objects.all()
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if image and image.size > settings.AUCTIONS_IMAGE_MAX_BYTES:
+            raise forms.ValidationError(f"images can be up to {filesizeformat(settings.AUCTIONS_IMAGE_MAX_BYTES)}")
+        return image
+
     def clean_image_url(self):
         image_url = self.cleaned_data.get('image_url')
         if image_url and not image_url.startswith(('http://', 'https://')):
             image_url = 'https://' + image_url
         return image_url if image_url else None
 
+    def save(self, commit=True):
+        listing = super().save(commit=False)
+        if self.cleaned_data.get('duration'):
+            listing.ends_at = timezone.now() + timedelta(days=self.cleaned_data['duration'])
+        if commit:
+            listing.save()
+        return listing
+
     class Meta:
         model = Listing
-        fields = ['title', 'description', 'image_url', 'starting_bid','category']
+        fields = ['title', 'description', 'image', 'image_url', 'starting_bid','category']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'validate'}),
             'description': forms.Textarea(attrs={'class': 'materialize-textarea'}),
@@ -35,6 +69,7 @@ class NewAuctionForm(forms.ModelForm):
         labels = {
             'title': 'product name',
             'description': 'description of product',
+            'image': 'upload an image (optional)',
             'starting_bid': 'starting price',
             'category': '',
         }
@@ -43,10 +78,13 @@ class BidForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         self.auction = kwargs.pop('auction', None)
         super(BidForm, self).__init__(*args, **kwargs)
-        self.fields['amount'].widget.attrs.update({'class': 'validate', 'step': '0.01'})
+        for field in self.fields.values():
+            field.widget.attrs.update({'class': 'validate', 'step': '0.01'})
 
     def clean_amount(self):
-        amount = self.cleaned_data['amount']
+        return self.check_amount(self.cleaned_data['amount'])
+
+    def check_amount(self, amount):
         if self.auction :
             if amount <= self.auction.current_price:
 
@@ -60,6 +98,17 @@ class BidForm(forms.ModelForm):
         labels = {'amount': 'Amount to bid $'}
 
 
+class ProxyBidForm(BidForm):
+    # a ceiling has to clear the current price just like a bid does
+    def clean_max_amount(self):
+        return self.check_amount(self.cleaned_data['max_amount'])
+
+    class Meta:
+        model = ProxyBid
+        fields = ['max_amount']
+        labels = {'max_amount': 'Bid for me up to $'}
+
+
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
@@ -71,4 +120,17 @@ class CommentForm(forms.ModelForm):
                 'data-length': '500'
             }),
         }
-        labels = {'body': ''}
\ No newline at end of file
+        labels = {'body': ''}
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(required=False, max_length=200, label='')
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.all(),
+        to_field_name='slug',
+        required=False,
+        empty_label='All categories',
+        widget=forms.Select(attrs={'class': 'browser-default'}),
+        label='',
+    )
+    include_closed = forms.BooleanField(required=False, label='Include closed auctions')
@@ -0,0 +1,52 @@
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+KEY_PREFIX = "auctions:fragment"
+
+_lock = threading.Lock()
+_stats = Counter()
+
+
+def fragment_key(name, vary_on):
+    # callers vary on (id, version), so a bid or edit moves the listing's
+    # fragments to new keys and the old ones simply age out
+    digest = hashlib.md5(":".join(str(value) for value in vary_on).encode()).hexdigest()
+    return f"{KEY_PREFIX}:{name}:{digest}"
+
+
+def cached_fragment(name, vary_on, render):
+    if not settings.AUCTIONS_FRAGMENT_CACHE:
+        return render()
+    key = fragment_key(name, vary_on)
+    content = cache.get(key)
+    if content is None:
+        _count(name, "misses")
+        content = render()
+        cache.set(key, content, settings.AUCTIONS_FRAGMENT_TIMEOUT)
+    else:
+        _count(name, "hits")
+    return content
+
+
+def fragment_stats():
+    # per-process {name: {"hits": n, "misses": n}}
+    with _lock:
+        stats = {}
+        for (name, outcome), count in _stats.items():
+            stats.setdefault(name, {"hits": 0, "misses": 0})[outcome] = count
+        return stats
+
+
+def reset_fragment_stats():
+    with _lock:
+        _stats.clear()
+
+
+def _count(name, outcome):
+    with _lock:
+        _stats[name, outcome] += 1
@@ -0,0 +1,83 @@
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from . import renditions
+from .models import Listing
+from .page_cache import purge_listing
+
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = "renditions"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # spawned rather than forked, the web process has threads of its own
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.AUCTIONS_IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def schedule_renditions(listing_id):
+    # called once the upload is committed. the response does not wait for it,
+    # cards show the original image until the thumbnail is in
+    transaction.on_commit(lambda: submit_renditions(listing_id))
+
+
+def submit_renditions(listing_id):
+    listing = Listing.objects.filter(pk=listing_id).only("image").first()
+    if listing is None or not listing.image:
+        return None
+    args = render_args(listing.image)
+    if not settings.AUCTIONS_IMAGE_WORKERS:
+        save_renditions(listing_id, renditions.render(*args))
+        return None
+    future = get_pool().submit(renditions.render, *args)
+    future.add_done_callback(lambda future: _finished(listing_id, future))
+    return future
+
+
+def render_args(image):
+    with image.open("rb") as f:
+        data = f.read()
+    return data, settings.AUCTIONS_THUMBNAIL_SIZE, settings.AUCTIONS_DETAIL_SIZE, settings.AUCTIONS_IMAGE_QUALITY
+
+
+def save_renditions(listing_id, result):
+    fields = {}
+    for name, (data, (width, height)) in result.items():
+        # named after the content, so the files can be cached forever
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        path = default_storage.save(f"{RENDITIONS_DIR}/{listing_id}/{digest}-{name}.jpg", ContentFile(data))
+        fields.update({name: path, f"{name}_width": width, f"{name}_height": height})
+    Listing.objects.filter(pk=listing_id).update(**fields, version=F("version") + 1)
+    purge_listing(listing_id)
+
+
+def _finished(listing_id, future):
+    # runs on the pool's result thread
+    try:
+        save_renditions(listing_id, future.result())
+    except Exception:
+        logger.exception("could not make the renditions of listing %s", listing_id)
+    finally:
+        close_old_connections()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from auctions.archive import archive_closed_bids
+
+
+class Command(BaseCommand):
+    help = "Move the bids of closed auctions out of the hot Bid table into ArchivedBid, in short chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="About this many bids per transaction.")
+        parser.add_argument("--pause", type=float, default=0.05, help="Seconds between chunks, for bids to get in.")
+
+    def handle(self, *args, **options):
+        moved, listings = archive_closed_bids(options["batch_size"], options["pause"])
+        self.stdout.write(f"Archived {moved} bids from {listings} closed auctions.")
@@ -0,0 +1,79 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from auctions import renditions
+from auctions.images import get_pool, render_args, save_renditions
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the thumbnail and detail renditions of listings that have none, in the image "
+        "worker pool. With --source-dir, first take the originals of hotlinked image_urls "
+        "from local files of the same name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source-dir", help="Directory holding local copies of image_url files.")
+        parser.add_argument("--force", action="store_true", help="Redo listings that already have renditions.")
+
+    def handle(self, *args, **options):
+        if options["source_dir"]:
+            if not os.path.isdir(options["source_dir"]):
+                raise CommandError(f"{options['source_dir']} is not a directory")
+            imported = self.import_originals(options["source_dir"])
+            self.stdout.write(f"Took {imported} originals from {options['source_dir']}.")
+
+        listings = Listing.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["force"]:
+            listings = listings.filter(Q(thumbnail__isnull=True) | Q(thumbnail=""))
+        done = failed = 0
+        # a few images per worker in flight, so memory stays flat
+        limit = max(1, settings.AUCTIONS_IMAGE_WORKERS) * 4
+        pending = {}
+        for listing in listings.only("id", "image").order_by("id").iterator():
+            if not settings.AUCTIONS_IMAGE_WORKERS:
+                ok = self.save(listing.pk, lambda: renditions.render(*render_args(listing.image)))
+                done, failed = done + ok, failed + (not ok)
+                continue
+            pending[get_pool().submit(renditions.render, *render_args(listing.image))] = listing.pk
+            while len(pending) >= limit:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    ok = self.save(pending.pop(future), future.result)
+                    done, failed = done + ok, failed + (not ok)
+        for future in wait(pending).done:
+            ok = self.save(pending[future], future.result)
+            done, failed = done + ok, failed + (not ok)
+        self.stdout.write(f"Made renditions for {done} listings, {failed} failed.")
+
+    def import_originals(self, source_dir):
+        imported = 0
+        hotlinked = (
+            Listing.objects.filter(Q(image__isnull=True) | Q(image=""), image_url__isnull=False)
+            .exclude(image_url="")
+        )
+        for listing in hotlinked.only("id", "image_url", "image").iterator():
+            name = os.path.basename(urlparse(listing.image_url).path)
+            path = os.path.join(source_dir, name)
+            if not name or not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                listing.image.save(name, File(f), save=False)
+            Listing.objects.filter(pk=listing.pk).update(image=listing.image.name)
+            imported += 1
+        return imported
+
+    def save(self, listing_id, result):
+        try:
+            save_renditions(listing_id, result())
+        except Exception as e:
+            self.stderr.write(f"listing {listing_id}: {e}")
+            return False
+        return True
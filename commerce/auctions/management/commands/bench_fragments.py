@@ -0,0 +1,63 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from auctions.fragments import fragment_stats, reset_fragment_stats
+from auctions.models import Listing
+from auctions.seed import seed
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database and compare page render times with and without fragment caching."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=2000)
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        reset_fragment_stats()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seed(users=50, listings=options["listings"], active_ratio=1)
+            ids = list(Listing.objects.order_by("-id").values_list("id", flat=True)[:20])
+            pages = {
+                "index": [reverse("index")],
+                "auction_view": [reverse("auction_view", args=[pk]) for pk in ids],
+            }
+            # the test client sends Host: testserver, and the anonymous page
+            # cache would answer before any fragment is rendered
+            with override_settings(ALLOWED_HOSTS=["testserver"], AUCTIONS_PAGE_CACHE=False):
+                results = {
+                    (page, label): self.measure(urls, options["requests"], enabled)
+                    for page, urls in pages.items()
+                    for label, enabled in (("uncached", False), ("cached", True))
+                }
+                stats = fragment_stats()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for page in pages:
+            uncached, cached = results[page, "uncached"], results[page, "cached"]
+            self.stdout.write(
+                f"{page}: {uncached / options['requests'] * 1000:.2f} ms uncached, "
+                f"{cached / options['requests'] * 1000:.2f} ms cached ({uncached / cached:.2f}x)"
+            )
+        for name, counts in sorted(stats.items()):
+            total = counts["hits"] + counts["misses"]
+            self.stdout.write(f"{name}: {counts['hits']} hits, {counts['misses']} misses ({counts['hits'] / total:.0%})")
+
+    def measure(self, urls, requests, enabled):
+        client = Client()
+        cache.clear()
+        with override_settings(AUCTIONS_FRAGMENT_CACHE=enabled):
+            # one pass to warm the cache (and the template loader) first
+            for url in urls:
+                client.get(url)
+            started = time.perf_counter()
+            for i in range(requests):
+                client.get(urls[i % len(urls)])
+            return time.perf_counter() - started
@@ -0,0 +1,122 @@
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+
+from auctions.events import hub
+from auctions.models import Listing
+from auctions.seed import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many idle live-update streams against the ASGI application in-process and "
+        "report the memory each one holds and how long one bid takes to reach them all."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seed(users=1, listings=1, bids_per_listing=0, comments_per_listing=0,
+                 watched_per_user=0, active_ratio=1)
+            listing = Listing.objects.get()
+            path = reverse("auction_events", args=[listing.pk])
+            # the fake connections send Host: localhost, which only DEBUG allows by itself
+            with override_settings(ALLOWED_HOSTS=["localhost"]):
+                result = asyncio.run(self.run(path, listing.pk, options["connections"]))
+        finally:
+            connection.close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        count, per_connection, fan_out = result
+        self.stdout.write(f"connections:          {count}")
+        self.stdout.write(f"memory per idle conn: {per_connection / 1024:.1f} KiB")
+        self.stdout.write(f"fan-out of one bid:   {fan_out * 1000:.1f} ms")
+
+    async def run(self, path, listing_id, count):
+        application = get_asgi_application()
+        # warm up so imports and caches are not counted against the first stream
+        await self.close(await self.open_streams(application, path, 1))
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        streams = await self.open_streams(application, path, count)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        hub.publish(listing_id, "bid", {"price": "1.00", "bidder": "bench"})
+        await asyncio.gather(*(stream.next_chunk() for stream in streams))
+        fan_out = time.perf_counter() - started
+
+        connected = hub.subscriber_count(listing_id)
+        await self.close(streams)
+        return connected, (after - before) / count, fan_out
+
+    async def open_streams(self, application, path, count):
+        streams = [FakeConnection(application, path) for _ in range(count)]
+        # the first chunk is the snapshot, so every stream is subscribed after it
+        await asyncio.gather(*(stream.next_chunk() for stream in streams))
+        return streams
+
+    async def close(self, streams):
+        for stream in streams:
+            stream.disconnect()
+        await asyncio.gather(*(stream.task for stream in streams), return_exceptions=True)
+
+
+class FakeConnection:
+    # just enough of an ASGI server to hold one streaming request open
+
+    def __init__(self, application, path):
+        self.chunks = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        self.sent_request = False
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"localhost"), (b"accept", b"text/event-stream")],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        self.task = asyncio.ensure_future(application(scope, self.receive, self.send))
+
+    async def receive(self):
+        if not self.sent_request:
+            self.sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            await self.chunks.put(CommandError(f"the stream answered {message['status']}"))
+        if message["type"] == "http.response.body" and message.get("body"):
+            await self.chunks.put(message["body"])
+
+    async def next_chunk(self):
+        chunk = await self.chunks.get()
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+    def disconnect(self):
+        self.disconnected.set()
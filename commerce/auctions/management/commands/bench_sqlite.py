@@ -0,0 +1,169 @@
+import json
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from auctions.models import User, Listing
+from auctions.seed import seed
+
+from .bench_views import _git_commit, _summary
+
+
+# the setup before this profile: rollback journal, default cache, no mmap,
+# a connection per request. journal_mode is stored in the file, so it is
+# set back explicitly
+PROFILES = {
+    "stock": {"pragmas": {"journal_mode": "DELETE", "synchronous": "FULL"}, "conn_max_age": 0},
+    "tuned": {"pragmas": settings.SQLITE_PRAGMAS, "conn_max_age": settings.DATABASES["default"]["CONN_MAX_AGE"]},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a mixed read/bid workload from concurrent clients against a throwaway database "
+        "under the stock and the tuned SQLite settings, and compare throughput, latency and errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--listings", type=int, default=20000)
+        parser.add_argument("--bids-per-listing", type=int, default=10)
+        parser.add_argument("--clients", type=int, default=8, help="Concurrent clients, one thread each.")
+        parser.add_argument("--requests", type=int, default=300, help="Requests per client per profile.")
+        parser.add_argument("--bid-ratio", type=float, default=0.2, help="Share of requests that are bids.")
+        parser.add_argument("--hot-listings", type=int, default=20, help="Bids go to this many listings.")
+        parser.add_argument("--profile", action="append", choices=PROFILES, help="Run only these (repeatable).")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        saved = settings_dict["OPTIONS"].get("init_command"), settings_dict["CONN_MAX_AGE"]
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Seeding {options['listings']} listings...")
+            seed(
+                users=options["users"],
+                listings=options["listings"],
+                bids_per_listing=options["bids_per_listing"],
+                comments_per_listing=0,
+                watched_per_user=0,
+            )
+            self.open_ids = list(Listing.objects.open().values_list("id", flat=True))
+            self.hot_ids = self.open_ids[:options["hot_listings"]]
+            self.user_ids = list(User.objects.values_list("id", flat=True))
+
+            results = {}
+            with override_settings(ALLOWED_HOSTS=["testserver"], AUCTIONS_PAGE_CACHE=False):
+                for name in options["profile"] or PROFILES:
+                    self.use_profile(PROFILES[name])
+                    results[name] = self.run(options)
+                    self.report(name, results[name])
+        finally:
+            settings_dict["OPTIONS"]["init_command"], settings_dict["CONN_MAX_AGE"] = saved
+            connection.close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({"commit": _git_commit(), "options": {
+                    key: options[key] for key in ("users", "listings", "bids_per_listing", "clients", "requests", "bid_ratio", "hot_listings")
+                }, "profiles": results}, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def use_profile(self, profile):
+        # every thread builds its connection from this same settings dict
+        connection.settings_dict["OPTIONS"]["init_command"] = ";".join(
+            f"PRAGMA {name}={value}" for name, value in profile["pragmas"].items()
+        )
+        connection.settings_dict["CONN_MAX_AGE"] = profile["conn_max_age"]
+        connection.close()
+        # one connection to switch the journal mode before the clients start
+        connection.ensure_connection()
+        connection.close()
+
+    def run(self, options):
+        latencies = {"read": [], "bid": []}
+        errors = {"read": 0, "bid": 0}
+        lock = threading.Lock()
+        opened = []
+
+        def count_connection(sender, **kwargs):
+            with lock:
+                opened.append(1)
+
+        def work(seed):
+            rng = random.Random(seed)
+            client = Client()
+            client.force_login(User.objects.get(pk=rng.choice(self.user_ids)))
+            mine = {"read": [], "bid": []}
+            failed = {"read": 0, "bid": 0}
+            try:
+                for _ in range(options["requests"]):
+                    kind = "bid" if rng.random() < options["bid_ratio"] else "read"
+                    method, url, data = self.request_for(kind, rng)
+                    # the test client disconnects close_old_connections from
+                    # the request signals, so do what a real handler would:
+                    # under CONN_MAX_AGE=0 every request opens its own
+                    close_old_connections()
+                    started = time.perf_counter()
+                    try:
+                        response = client.post(url, data) if method == "POST" else client.get(url, data)
+                        ok = response.status_code < 400
+                    except Exception:
+                        # "database is locked" and friends surface here
+                        ok = False
+                    mine[kind].append(time.perf_counter() - started)
+                    failed[kind] += not ok
+                    close_old_connections()
+            finally:
+                connection.close()
+            with lock:
+                for kind in mine:
+                    latencies[kind].extend(mine[kind])
+                    errors[kind] += failed[kind]
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(options["clients"])]
+        connection_created.connect(count_connection)
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            connection_created.disconnect(count_connection)
+        elapsed = time.perf_counter() - started
+        total = sum(len(samples) for samples in latencies.values())
+        return {
+            "throughput_rps": round(total / elapsed, 1),
+            "connections": len(opened),
+            **{kind: _summary(samples, errors[kind], elapsed) for kind, samples in latencies.items() if samples},
+        }
+
+    def request_for(self, kind, rng):
+        if kind == "bid":
+            pk = rng.choice(self.hot_ids)
+            # reading the price is part of the setup, not the measured request
+            price = Listing.objects.filter(pk=pk).values_list("current_price", flat=True).get()
+            return "POST", reverse("auction_view", args=[pk]), {"bid": "", "amount": str(price + Decimal(rng.randint(1, 20)))}
+        if rng.random() < 0.5:
+            return "GET", reverse("index"), {}
+        return "GET", reverse("auction_view", args=[rng.choice(self.open_ids)]), {}
+
+    def report(self, name, result):
+        self.stdout.write(f"{name}: {result['throughput_rps']:.1f} req/s, {result['connections']} connections opened")
+        for kind in ("read", "bid"):
+            if kind in result:
+                summary = result[kind]
+                self.stdout.write(
+                    f"  {kind:>5}: p50 {summary['p50_ms']:7.2f} ms  p95 {summary['p95_ms']:7.2f} ms  "
+                    f"p99 {summary['p99_ms']:7.2f} ms  errors {summary['errors']}"
+                )
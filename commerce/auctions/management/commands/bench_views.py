@@ -0,0 +1,197 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from auctions.models import User, Listing
+from auctions.seed import seed
+
+
+SCENARIOS = ("index", "auction_view", "bid", "categories", "watchlist")
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database at production-like volume, drive the main views with "
+        "concurrent clients and write throughput and latency percentiles to a JSON file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--listings", type=int, default=100000)
+        parser.add_argument("--bids-per-listing", type=int, default=20)
+        parser.add_argument("--comments-per-listing", type=int, default=5)
+        parser.add_argument("--watched-per-user", type=int, default=50)
+        parser.add_argument("--clients", type=int, default=8, help="Concurrent clients, one thread each.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per client per scenario.")
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Run only these (repeatable).")
+        parser.add_argument("--page-cache", action="store_true", help="Leave the anonymous page cache on.")
+        parser.add_argument("--output", default="bench-results.json")
+        parser.add_argument("--baseline", help="Earlier results file to compare p95 latencies against.")
+        parser.add_argument("--max-regression", type=float, default=0.2,
+                            help="Fail when a p95 is this much slower than the baseline (0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Seeding {options['listings']} listings...")
+            started = time.perf_counter()
+            seed(
+                users=options["users"],
+                listings=options["listings"],
+                bids_per_listing=options["bids_per_listing"],
+                comments_per_listing=options["comments_per_listing"],
+                watched_per_user=options["watched_per_user"],
+            )
+            seed_seconds = time.perf_counter() - started
+            self.prepare()
+            # the test client sends Host: testserver
+            with override_settings(ALLOWED_HOSTS=["testserver"], AUCTIONS_PAGE_CACHE=options["page_cache"]):
+                scenarios = {}
+                for name in options["scenario"] or SCENARIOS:
+                    scenarios[name] = self.run_scenario(name, options["clients"], options["requests"])
+                    self.report(name, scenarios[name])
+        finally:
+            connection.close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results = {
+            "commit": _git_commit(),
+            "timestamp": timezone.now().isoformat(),
+            "options": {key: options[key] for key in (
+                "users", "listings", "bids_per_listing", "comments_per_listing",
+                "watched_per_user", "clients", "requests", "page_cache",
+            )},
+            "dataset": self.dataset,
+            "seed_seconds": round(seed_seconds, 1),
+            "scenarios": scenarios,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            self.compare(baseline, results, options["max_regression"])
+
+    def prepare(self):
+        # everything the clients pick from, read once up front
+        self.open_ids = list(Listing.objects.open().values_list("id", flat=True))
+        self.user_ids = list(User.objects.values_list("id", flat=True))
+        self.dataset = {
+            "listings": Listing.objects.count(),
+            "open_listings": len(self.open_ids),
+            "bids": sum(Listing.objects.values_list("bid_count", flat=True).iterator()),
+            "comments": sum(Listing.objects.values_list("comment_count", flat=True).iterator()),
+            "watched": Listing.favoured.through.objects.count(),
+        }
+        self.stdout.write(", ".join(f"{count} {name}" for name, count in self.dataset.items()))
+
+    def run_scenario(self, name, clients, requests):
+        samples = []
+        errors = []
+        lock = threading.Lock()
+
+        def work(seed):
+            rng = random.Random(seed)
+            client = Client()
+            if name in ("bid", "watchlist"):
+                client.force_login(User.objects.get(pk=rng.choice(self.user_ids)))
+            latencies = []
+            failed = 0
+            try:
+                for _ in range(requests):
+                    method, url, data = self.request_for(name, rng)
+                    started = time.perf_counter()
+                    response = client.post(url, data) if method == "POST" else client.get(url, data)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code >= 400:
+                        failed += 1
+            finally:
+                connection.close()
+            with lock:
+                samples.extend(latencies)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return _summary(samples, sum(errors), elapsed)
+
+    def request_for(self, name, rng):
+        if name == "index":
+            return "GET", reverse("index"), {"sort": rng.choice(["newest", "popular"])}
+        if name == "auction_view":
+            return "GET", reverse("auction_view", args=[rng.choice(self.open_ids)]), {}
+        if name == "bid":
+            pk = rng.choice(self.open_ids)
+            # reading the price is part of the setup, not the measured request
+            price = Listing.objects.filter(pk=pk).values_list("current_price", flat=True).get()
+            amount = price + Decimal(rng.randint(1, 20))
+            return "POST", reverse("auction_view", args=[pk]), {"bid": "", "amount": str(amount)}
+        if name == "categories":
+            return "GET", reverse("categories"), {}
+        return "GET", reverse("watchlist"), {}
+
+    def report(self, name, summary):
+        self.stdout.write(
+            f"{name:>13}: {summary['throughput_rps']:8.1f} req/s  "
+            f"p50 {summary['p50_ms']:7.2f} ms  p95 {summary['p95_ms']:7.2f} ms  "
+            f"p99 {summary['p99_ms']:7.2f} ms  errors {summary['errors']}"
+        )
+
+    def compare(self, baseline, results, max_regression):
+        regressions = []
+        for name, summary in results["scenarios"].items():
+            before = baseline.get("scenarios", {}).get(name)
+            if not before:
+                continue
+            change = summary["p95_ms"] / before["p95_ms"] - 1
+            self.stdout.write(f"{name:>13}: p95 {before['p95_ms']:.2f} -> {summary['p95_ms']:.2f} ms ({change:+.0%})")
+            if change > max_regression:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f"p95 regressed by more than {max_regression:.0%}: {', '.join(regressions)}")
+
+
+def _summary(samples, errors, elapsed):
+    samples = sorted(samples)
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p90_ms": round(cuts[89] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from auctions.query_plans import check_query_plans
+from auctions.seed import seed
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database and fail if a hot query plans a full table scan or a sort."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--listings", type=int, default=50000)
+        parser.add_argument("--bids-per-listing", type=int, default=10)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("query plan checks only understand SQLite's EXPLAIN QUERY PLAN")
+
+        verbosity = options["verbosity"]
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Seeding {options['listings']} listings...")
+            seed(
+                users=options["users"],
+                listings=options["listings"],
+                bids_per_listing=options["bids_per_listing"],
+            )
+            report = check_query_plans()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        failed = False
+        for name, plan, problems in report:
+            if problems:
+                failed = True
+                self.stdout.write(self.style.ERROR(f"{name}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+            if verbosity > 1 or problems:
+                self.stdout.write(plan)
+        if failed:
+            raise CommandError("some hot queries are not served by an index")
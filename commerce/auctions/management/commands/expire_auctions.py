@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from auctions.expiry import ExpiryScheduler, close_expired_auctions
+
+
+class Command(BaseCommand):
+    help = "Close auctions whose end time has passed, either once or continuously."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Close what has expired now and exit (for cron).")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            closed = close_expired_auctions()
+            self.stdout.write(f"Closed {len(closed)} expired auctions.")
+            return
+
+        self.stdout.write("Watching auction deadlines, press CONTROL-C to stop.")
+        try:
+            ExpiryScheduler().run()
+        except KeyboardInterrupt:
+            pass
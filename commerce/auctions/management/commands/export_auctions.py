@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.transfer import RECORD_TYPES, export_records, write_csv, write_jsonl
+
+
+class Command(BaseCommand):
+    help = "Stream users, categories, listings and bids out as JSON lines, or one type as CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+        parser.add_argument("--type", action="append", choices=RECORD_TYPES, dest="types",
+                            help="Record types to export (repeatable, exactly one for CSV). Default: all.")
+        parser.add_argument("-o", "--output", help="File to write to instead of stdout.")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        types = [t for t in RECORD_TYPES if t in options["types"]] if options["types"] else list(RECORD_TYPES)
+        if options["format"] == "csv" and len(types) != 1:
+            raise CommandError("CSV holds one record type per file, pass exactly one --type")
+
+        out = open(options["output"], "w", newline="") if options["output"] else self.stdout
+        try:
+            records = export_records(types, options["chunk_size"])
+            if options["format"] == "csv":
+                write_csv(records, out, types[0])
+            else:
+                write_jsonl(records, out)
+        finally:
+            if options["output"]:
+                out.close()
@@ -0,0 +1,65 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.transfer import RECORD_TYPES, ImportFailed, Importer, read_csv, read_jsonl
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream users, categories, listings and bids in from JSON lines (as written by "
+        "export_auctions) or CSV, in batched bulk inserts with a transaction per batch. A failed "
+        "batch is rolled back on its own; the batches before it stay imported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, or - for stdin.")
+        parser.add_argument("--format", choices=["jsonl", "csv"], help="Default: from the file extension.")
+        parser.add_argument("--type", choices=RECORD_TYPES, help="Record type of a CSV file.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--keep-ids", action="store_true",
+            help="Give listings their source ids, and let bids refer to existing listings by id. "
+                 "Use for both the listing and the bid CSV of one export.",
+        )
+        parser.add_argument(
+            "--attach-existing", action="store_true",
+            help="Let bids whose listing is not in the import attach to the existing listing with that id.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or ("csv" if path.endswith(".csv") else "jsonl")
+        if file_format == "csv" and not options["type"]:
+            raise CommandError("CSV files hold one record type, pass --type")
+
+        started = time.perf_counter()
+        source = sys.stdin if path == "-" else open(path, newline="")
+        try:
+            records = read_csv(source, options["type"]) if file_format == "csv" else read_jsonl(source)
+            importer = Importer(
+                batch_size=options["batch_size"],
+                keep_ids=options["keep_ids"],
+                attach_existing=options["attach_existing"],
+            )
+            try:
+                for number, (record_type, record) in enumerate(records, 1):
+                    try:
+                        importer.add(record_type, record)
+                    except (ImportFailed, KeyError, ValueError, ArithmeticError) as e:
+                        raise CommandError(f"record {number}: {e!r}, {importer.committed} records before it imported")
+                try:
+                    counts = importer.finish()
+                except (ImportFailed, KeyError, ValueError, ArithmeticError) as e:
+                    raise CommandError(f"final batch: {e!r}, {importer.committed} records before it imported")
+            except CommandError:
+                # the committed batches still get their summaries and purges
+                importer.settle()
+                raise
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        summary = ", ".join(f"{counts[t]} {t} records" for t in RECORD_TYPES if counts[t])
+        self.stdout.write(f"Imported {summary or 'nothing'} in {time.perf_counter() - started:.1f}s.")
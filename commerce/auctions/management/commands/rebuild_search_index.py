@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.search import ensure_search_index, rebuild_search_index, search_available
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text listing search index from the listings table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument(
+            "--optimize", action="store_true",
+            help="Merge the index b-trees afterwards (slower, smaller and faster to query).",
+        )
+
+    def handle(self, *args, **options):
+        if not search_available(options["database"]):
+            raise CommandError("full-text search needs SQLite with FTS5")
+        ensure_search_index(options["database"])
+        rebuild_search_index(options["database"], optimize=options["optimize"])
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.replicas import copy_to_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the AUCTIONS_REPLICA_FILES, once or every "
+        "--interval seconds, as a local stand-in for replication."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Copy once and exit.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds between copies, the replica lag.")
+
+    def handle(self, *args, **options):
+        if not settings.AUCTIONS_READ_REPLICAS:
+            raise CommandError("No replicas configured, set AUCTIONS_REPLICA_FILES.")
+        if options["once"]:
+            copy_to_replicas()
+            self.stdout.write(f"Copied the primary to {len(settings.AUCTIONS_READ_REPLICAS)} replicas.")
+            return
+
+        self.stdout.write(f"Copying the primary every {options['interval']}s, press CONTROL-C to stop.")
+        try:
+            while True:
+                copy_to_replicas()
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,150 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import Counter
+
+from django.template.backends.django import Template
+
+from .fragments import fragment_stats
+
+
+# per-process, like the other in-memory registries here: each worker
+# reports its own requests and Prometheus sums across the scrape targets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    "auctions_request_duration_seconds": ("Total time to produce the response.", DURATION_BUCKETS),
+    "auctions_request_queries": ("SQL queries issued per request.", QUERY_BUCKETS),
+    "auctions_request_sql_seconds": ("Time spent in SQL per request.", DURATION_BUCKETS),
+    "auctions_request_template_seconds": ("Time spent rendering templates per request.", DURATION_BUCKETS),
+}
+
+_lock = threading.Lock()
+# (metric, view) -> [bucket counts..., +Inf count, sum]
+_histograms = {}
+_over_budget = Counter()
+
+# the stats of the request being handled, if any. a context variable so
+# sync_to_async threads and async views see their own request's stats
+current_request = contextvars.ContextVar("auctions_request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("queries", "sql_time", "template_time", "rendering")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+
+def count_query(execute, sql, params, many, context):
+    # installed once on every connection rather than around each request:
+    # async views run their queries on sync_to_async threads, each with
+    # its own connection, and the context variable follows them there
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.sql_time += time.perf_counter() - started
+
+
+def instrument_connection(connection):
+    # first in the list: execute_wrapper() pops from the end
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+def observe(metric, view, value):
+    buckets = HISTOGRAMS[metric][1]
+    with _lock:
+        series = _histograms.get((metric, view))
+        if series is None:
+            series = _histograms[metric, view] = [0] * (len(buckets) + 2)
+        series[bisect.bisect_left(buckets, value)] += 1
+        series[-1] += value
+
+
+def record_request(view, duration, stats):
+    observe("auctions_request_duration_seconds", view, duration)
+    observe("auctions_request_queries", view, stats.queries)
+    observe("auctions_request_sql_seconds", view, stats.sql_time)
+    observe("auctions_request_template_seconds", view, stats.template_time)
+
+
+def count_over_budget(view):
+    with _lock:
+        _over_budget[view] += 1
+
+
+def reset_metrics():
+    with _lock:
+        _histograms.clear()
+        _over_budget.clear()
+
+
+def render_prometheus():
+    with _lock:
+        histograms = {key: list(series) for key, series in _histograms.items()}
+        over_budget = dict(_over_budget)
+
+    lines = []
+    for metric, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, view), series in sorted(histograms.items()):
+            if name != metric:
+                continue
+            label = f'view="{_escape(view)}"'
+            cumulative = 0
+            for bound, count in zip((*buckets, "+Inf"), series):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label}}} {series[-1]}")
+            lines.append(f"{metric}_count{{{label}}} {cumulative}")
+
+    lines.append("# HELP auctions_query_budget_exceeded_total Requests that issued more queries than AUCTIONS_QUERY_BUDGET.")
+    lines.append("# TYPE auctions_query_budget_exceeded_total counter")
+    for view, count in sorted(over_budget.items()):
+        lines.append(f'auctions_query_budget_exceeded_total{{view="{_escape(view)}"}} {count}')
+
+    lines.append("# HELP auctions_fragment_cache_total Template fragment cache lookups.")
+    lines.append("# TYPE auctions_fragment_cache_total counter")
+    for name, counts in sorted(fragment_stats().items()):
+        for outcome in ("hits", "misses"):
+            lines.append(f'auctions_fragment_cache_total{{fragment="{_escape(name)}",outcome="{outcome}"}} {counts[outcome]}')
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def instrument_templates():
+    # times top-level renders (render(), TemplateResponse); includes and
+    # fragments render inside them and are not counted twice
+    if getattr(Template.render, "instrumented", False):
+        return
+    render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        stats = current_request.get()
+        if stats is None or stats.rendering:
+            return render(self, context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.rendering = False
+
+    timed_render.instrumented = True
+    Template.render = timed_render
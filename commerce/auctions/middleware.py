@@ -0,0 +1,110 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import RequestStats, count_over_budget, current_request, instrument_templates, record_request
+from .replicas import PIN_COOKIE, RequestRoute, current_route
+
+
+logger = logging.getLogger("auctions.metrics")
+
+
+class MetricsMiddleware:
+    # records query count, SQL time, template time and latency per URL name.
+    # goes first in MIDDLEWARE so the latency covers the other middleware.
+    # sync and async, so async views are not pushed through a thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        instrument_templates()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, time.perf_counter() - started, stats)
+        return response
+
+    def record(self, request, duration, stats):
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        record_request(view, duration, stats)
+        if stats.queries > settings.AUCTIONS_QUERY_BUDGET:
+            count_over_budget(view)
+            logger.warning(
+                "%s issued %d queries (budget %d) for %s",
+                view, stats.queries, settings.AUCTIONS_QUERY_BUDGET, request.get_full_path(),
+            )
+
+
+class ReplicaRoutingMiddleware:
+    # lets the request's reads go to a replica (auctions.replicas), unless
+    # it is a write or the user wrote within AUCTIONS_PRIMARY_STICKY_SECONDS.
+    # the route is a context variable, so async views carry it too
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        route = RequestRoute(pinned=request.method not in ("GET", "HEAD", "OPTIONS") or _pinned(request))
+        token = current_route.set(route)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_route.reset(token)
+        return self.remember_write(route, response)
+
+    async def __acall__(self, request):
+        route = RequestRoute(pinned=request.method not in ("GET", "HEAD", "OPTIONS") or _pinned(request))
+        token = current_route.set(route)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_route.reset(token)
+        return self.remember_write(route, response)
+
+    def remember_write(self, route, response):
+        if route.wrote and settings.AUCTIONS_READ_REPLICAS:
+            sticky = settings.AUCTIONS_PRIMARY_STICKY_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, str(time.time() + sticky), max_age=sticky, httponly=True, samesite="Lax",
+            )
+        return response
+
+
+def _pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_bid_summary(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+    bids = Bid.objects.filter(auction=OuterRef('pk'))
+    top = bids.order_by('-amount', 'id')
+    Listing.objects.update(
+        bid_count=Coalesce(Subquery(bids.values('auction').annotate(n=Count('id')).values('n')), 0),
+        top_bid=Subquery(top.values('amount')[:1]),
+        top_bidder=Subquery(top.values('user')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0003_add_default_categories'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='top_bid',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='top_bidder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leading_auctions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_bid_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_watcher_count(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Favoured = Listing.favoured.through
+    watchers = Favoured.objects.filter(listing=OuterRef('pk')).values('listing').annotate(n=Count('id')).values('n')
+    Listing.objects.update(watcher_count=Coalesce(Subquery(watchers), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='watcher_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_watcher_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-watcher_count', '-id'], name='listing_popular_idx'),
+        ),
+    ]
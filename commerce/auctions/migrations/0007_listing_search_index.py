@@ -0,0 +1,69 @@
+from django.db import migrations
+
+
+# external-content FTS5 index over auctions_listing. the triggers only fire
+# on title/description changes, so price updates from bids never touch it
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS auctions_listing_fts USING fts5(
+        title, description,
+        content='auctions_listing', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS auctions_listing_fts_insert AFTER INSERT ON auctions_listing BEGIN
+        INSERT INTO auctions_listing_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS auctions_listing_fts_delete AFTER DELETE ON auctions_listing BEGIN
+        INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS auctions_listing_fts_update AFTER UPDATE OF title, description ON auctions_listing BEGIN
+        INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO auctions_listing_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    # title matches count ten times as much as description matches
+    "INSERT INTO auctions_listing_fts(auctions_listing_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    "INSERT INTO auctions_listing_fts(auctions_listing_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_update",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_delete",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_insert",
+    "DROP TABLE IF EXISTS auctions_listing_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0006_listing_watcher_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0007_listing_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('ends_at__isnull', False), ('is_active', True)), fields=['ends_at'], name='listing_deadline_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0008_listing_ends_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
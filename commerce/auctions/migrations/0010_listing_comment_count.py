@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:37
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_count(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Comment = apps.get_model('auctions', 'Comment')
+    comments = Comment.objects.filter(auction=OuterRef('pk')).values('auction').annotate(n=Count('id')).values('n')
+    Listing.objects.update(comment_count=Coalesce(Subquery(comments), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_listing_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_comment_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0010_listing_comment_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBid',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('timestamp', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='bids_archived',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('bids_archived', False), ('is_active', False)), fields=['id'], name='listing_unarchived_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedbid',
+            name='auction',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_bids', to='auctions.listing'),
+        ),
+        migrations.AddField(
+            model_name='archivedbid',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_bids', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbid',
+            index=models.Index(fields=['auction', 'amount', 'id'], name='archivedbid_auction_amount_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_archived_bids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='detail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='detail_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='detail_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='originals/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='thumbnail_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='thumbnail_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
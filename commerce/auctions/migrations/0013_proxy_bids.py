@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0012_listing_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProxyBid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('auction', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='proxy_bids', to='auctions.listing')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proxy_bids', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['auction', '-max_amount', 'updated_on'], name='proxybid_ceiling_idx')],
+                'constraints': [models.UniqueConstraint(fields=('auction', 'user'), name='proxybid_one_per_bidder')],
+            },
+        ),
+    ]
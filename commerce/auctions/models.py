@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -17,10 +18,27 @@ class Category(models.Model):
         return self.name
 
 
+class ListingQuerySet(models.QuerySet):
+    def open(self):
+        # active and not past the deadline, even if the expiry job is behind
+        return self.filter(
+            models.Q(ends_at__isnull=True) | models.Q(ends_at__gt=timezone.now()),
+            is_active=True,
+        )
+
+
 class Listing(models.Model):
     title = models.CharField(max_length=60)
     description = models.TextField(max_length=1000)
     image_url = models.URLField(blank=True, null=True)
+    # an uploaded original, and the renditions auctions.images makes of it
+    image = models.ImageField(upload_to="originals/%Y/%m/", blank=True, null=True)
+    thumbnail = models.ImageField(blank=True, null=True, editable=False)
+    thumbnail_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    thumbnail_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    detail = models.ImageField(blank=True, null=True, editable=False)
+    detail_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    detail_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
     starting_bid = models.DecimalField(max_digits=10, decimal_places=2)
     current_price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="listings")
@@ -28,6 +46,47 @@ class Listing(models.Model):
     is_active = models.BooleanField(default=True)
     winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="won_auctions")
     favoured = models.ManyToManyField(User, blank=True, related_name="favoured")
+    # bid summary, kept in step with the Bid rows by auctions.bidding
+    bid_count = models.PositiveIntegerField(default=0)
+    top_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    top_bidder = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="leading_auctions")
+    # number of users watching, kept in step with favoured by auctions.signals
+    watcher_count = models.PositiveIntegerField(default=0)
+    # number of comments, kept in step with Comment rows by auctions.signals
+    comment_count = models.PositiveIntegerField(default=0)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    # bumped by every bid, edit and close, so anything derived from the
+    # listing (API ETags, cached fragments) can be keyed on (id, version)
+    version = models.PositiveIntegerField(default=0)
+    # set once a closed listing's bids have moved to ArchivedBid
+    bids_archived = models.BooleanField(default=False)
+
+    objects = ListingQuerySet.as_manager()
+
+    @property
+    def is_open(self):
+        return self.is_active and (self.ends_at is None or self.ends_at > timezone.now())
+
+    class Meta:
+        indexes = [
+            # partial, so the newest-first walk over active listings never
+            # has to step over closed ones
+            models.Index(fields=["-id"], condition=models.Q(is_active=True), name="listing_active_idx"),
+            models.Index(fields=["category", "is_active"], name="listing_category_active_idx"),
+            models.Index(fields=["-watcher_count", "-id"], condition=models.Q(is_active=True), name="listing_popular_idx"),
+            models.Index(fields=["ends_at"], condition=models.Q(is_active=True, ends_at__isnull=False), name="listing_deadline_idx"),
+            models.Index(fields=["id"], condition=models.Q(is_active=False, bids_archived=False), name="listing_unarchived_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        # in the database, so an edit racing a bid cannot reuse its version
+        self.version = models.F("version") + 1
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=["version"])
 
     def __str__(self):
         return self.title
@@ -41,6 +100,53 @@ class Bid(models.Model):
 
     class Meta:
         ordering = ['-amount']
+        indexes = [
+            models.Index(fields=["auction", "amount"], name="bid_auction_amount_idx"),
+        ]
+
+    def __str__(self):
+        return f"Bid of ${self.amount} on {self.auction.title}"
+
+
+class ProxyBid(models.Model):
+    # a bidder's ceiling on a listing. auctions.bidding bids on their behalf
+    # up to it, never showing it to anyone
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="proxy_bids")
+    # covered by the (auction, user) constraint
+    auction = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="proxy_bids", db_index=False)
+    # when the ceiling was last raised, the earlier of two equal ceilings leads
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["auction", "user"], name="proxybid_one_per_bidder"),
+        ]
+        indexes = [
+            # the two highest ceilings of a listing are the first two entries
+            models.Index(fields=["auction", "-max_amount", "updated_on"], name="proxybid_ceiling_idx"),
+        ]
+
+    def __str__(self):
+        return f"Proxy up to ${self.max_amount} on {self.auction.title}"
+
+
+class ArchivedBid(models.Model):
+    # bids of closed listings, moved out of Bid by auctions.archive so the
+    # hot table only holds open auctions. keeps the original bid id
+    id = models.BigIntegerField(primary_key=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    timestamp = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.PROTECT, related_name="archived_bids")
+    # covered by the (auction, amount, id) index
+    auction = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="archived_bids", db_index=False)
+
+    class Meta:
+        indexes = [
+            # id spelled out: a bigint primary key is not SQLite's rowid, so
+            # the index would not carry it for the (-amount, -id) walk
+            models.Index(fields=["auction", "amount", "id"], name="archivedbid_auction_amount_idx"),
+        ]
 
     def __str__(self):
         return f"Bid of ${self.amount} on {self.auction.title}"
@@ -54,6 +160,9 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created_on']
+        indexes = [
+            models.Index(fields=["auction", "created_on"], name="comment_auction_created_idx"),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user} on {self.auction.title}"
\ No newline at end of file
@@ -0,0 +1,99 @@
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .replicas import read_from_primary
+
+
+KEY_PREFIX = "auctions:page"
+LISTS_TAG = "lists"
+
+
+def listing_tag(listing_id):
+    return f"listing:{listing_id}"
+
+
+def cache_anonymous_page(tags):
+    # full-page cache for logged-out GETs. `tags(request, *args, **kwargs)`
+    # names what the page shows; purging a tag orphans every page under it.
+    # anything that carries a session or messages cookie goes straight to
+    # the view, so deciding costs no database query
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable_request(request):
+                return view(request, *args, **kwargs)
+            key = _page_key(request, tags(request, *args, **kwargs))
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response["X-Page-Cache"] = "hit"
+            else:
+                # a replica can lag a purge, and its old rows would then be
+                # cached under the new tag tokens
+                read_from_primary()
+                response = view(request, *args, **kwargs)
+                if hasattr(response, "render") and callable(response.render):
+                    response = response.render()
+                if _cacheable_response(request, response):
+                    cache.set(key, (response.content, response["Content-Type"]), settings.AUCTIONS_PAGE_CACHE_TIMEOUT)
+                    response["X-Page-Cache"] = "miss"
+            patch_vary_headers(response, ["Cookie"])
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_listing(listing_id, lists=True):
+    # drop the listing's page, and by default every list page too since they
+    # show prices and bid counts. deferred to commit so a request racing the
+    # transaction cannot cache the old rows again under the new tags
+    tags = [listing_tag(listing_id)] + ([LISTS_TAG] if lists else [])
+    transaction.on_commit(lambda: cache.delete_many([_tag_key(tag) for tag in tags]))
+
+
+def purge_listings(listing_ids):
+    tags = [listing_tag(pk) for pk in listing_ids] + [LISTS_TAG]
+    transaction.on_commit(lambda: cache.delete_many([_tag_key(tag) for tag in tags]))
+
+
+def _cacheable_request(request):
+    return (
+        settings.AUCTIONS_PAGE_CACHE
+        and request.method in ("GET", "HEAD")
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and "messages" not in request.COOKIES
+    )
+
+
+def _cacheable_response(request, response):
+    # a page that asked for a CSRF token or sets any cookie is per-visitor
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+        and not response.has_header("Cache-Control")
+    )
+
+
+def _page_key(request, tags):
+    tag_keys = [_tag_key(tag) for tag in tags]
+    tokens = cache.get_many(tag_keys)
+    for tag_key in tag_keys:
+        if tag_key not in tokens:
+            tokens[tag_key] = cache.get_or_set(tag_key, uuid.uuid4().hex, None)
+    versions = ":".join(tokens[tag_key] for tag_key in tag_keys)
+    digest = hashlib.md5(f"{request.get_full_path()}|{versions}".encode()).hexdigest()
+    return f"{KEY_PREFIX}:{digest}"
+
+
+def _tag_key(tag):
+    return f"{KEY_PREFIX}:tag:{tag}"
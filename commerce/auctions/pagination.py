@@ -0,0 +1,153 @@
+import functools
+import operator
+
+from django.core import signing
+from django.db.models import Q
+from django.http import Http404
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    # keyset pagination: a page is "the next per_page rows after this row",
+    # so there is no COUNT(*) and no OFFSET, and page 1000 costs the same as
+    # page 1. the ordering must end in a unique, non-null key (normally id)
+    salt = "auctions.pagination"
+
+    def __init__(self, queryset, per_page, ordering=("-id",)):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [key.lstrip("-") for key in self.ordering]
+
+    def page(self, cursor=None):
+        position, backwards = self.decode(cursor) if cursor else (None, False)
+        ordering = [_flip(key) for key in self.ordering] if backwards else self.ordering
+
+        rows = self.fetch(ordering, position, self.per_page + 1)
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, position is not None
+        if not rows:
+            return CursorPage(rows)
+        return CursorPage(
+            rows,
+            next_cursor=self.encode(rows[-1]) if has_next else None,
+            previous_cursor=self.encode(rows[0], backwards=True) if has_previous else None,
+        )
+
+    def fetch(self, ordering, position, limit):
+        return fetch_after(self.queryset, ordering, position, limit)
+
+    def encode(self, row, backwards=False):
+        position = [_plain(_value(row, field)) for field in self.fields]
+        return signing.dumps([position, backwards], salt=self.salt, compress=True)
+
+    def decode(self, cursor):
+        try:
+            position, backwards = signing.loads(cursor, salt=self.salt)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise Http404("Invalid cursor")
+        if len(position) != len(self.fields):
+            raise Http404("Invalid cursor")
+        return position, backwards
+
+
+class MergedCursorPaginator(CursorPaginator):
+    # pages through several querysets with the same columns as if they were
+    # one, e.g. a table and its archive. each gives up to a page and the
+    # rows are merged here. a row found in more than one (moved between
+    # the reads) is kept once
+
+    def __init__(self, querysets, per_page, ordering=("-id",)):
+        super().__init__(None, per_page, ordering)
+        self.querysets = list(querysets)
+
+    def fetch(self, ordering, position, limit):
+        rows = []
+        for queryset in self.querysets:
+            rows.extend(fetch_after(queryset, ordering, position, limit))
+        if len(self.querysets) > 1:
+            # stable sorts, least significant key first
+            for key in reversed(ordering):
+                rows.sort(key=lambda row: _value(row, key.lstrip("-")), reverse=key.startswith("-"))
+            keys = [[_value(row, key.lstrip("-")) for key in ordering] for row in rows]
+            rows = [row for i, row in enumerate(rows) if i == 0 or keys[i] != keys[i - 1]]
+        return rows[:limit]
+
+
+class CursorPaginationMixin:
+    # drop-in replacement for ListView's page-number pagination. templates get
+    # page_obj.next_cursor / page_obj.previous_cursor instead of page numbers
+    cursor_param = "cursor"
+    ordering = ["-id"]
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.get_ordering())
+        page = paginator.page(self.request.GET.get(self.cursor_param))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # carry sort/search parameters over to the next and previous links
+        params = self.request.GET.copy()
+        params.pop(self.cursor_param, None)
+        context["pagination_query"] = params.urlencode()
+        return context
+
+
+def fetch_after(queryset, ordering, position, limit):
+    queryset = queryset.order_by(*ordering)
+    if position is not None:
+        queryset = queryset.filter(_after(ordering, position))
+    return list(queryset[:limit])
+
+
+def _after(ordering, position):
+    # (a, b) after (x, y) means a > x or (a = x and b > y), with the
+    # comparison flipped for descending keys
+    clauses = []
+    for i, key in enumerate(ordering):
+        equal = {prior.lstrip("-"): value for prior, value in zip(ordering[:i], position[:i])}
+        lookup = "lt" if key.startswith("-") else "gt"
+        clauses.append(Q(**equal, **{f"{key.lstrip('-')}__{lookup}": position[i]}))
+    return functools.reduce(operator.or_, clauses)
+
+
+def _flip(key):
+    return key[1:] if key.startswith("-") else f"-{key}"
+
+
+def _value(row, field):
+    if isinstance(row, dict):
+        return row[field]
+    return row.serializable_value(field)
+
+
+def _plain(value):
+    return value if isinstance(value, (int, str)) else str(value)
@@ -0,0 +1,53 @@
+import re
+
+from django.utils import timezone
+
+from .models import User, Category, Listing, Bid, ArchivedBid, ProxyBid, Comment
+from .watchlist import watchlist_for
+
+
+# "SCAN auctions_bid" is a full table scan, "SCAN auctions_bid USING INDEX ..."
+# walks an index and is fine
+FULL_SCAN = re.compile(r"\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)\s*$")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)")
+
+
+def hot_queries():
+    # the queries behind the index, category, auction and watchlist pages,
+    # against whatever rows happen to exist
+    listing = Listing.objects.order_by("id").first()
+    category = Category.objects.order_by("id").first()
+    user = User.objects.order_by("id").first()
+    return [
+        # open(), as the views use, not just is_active: the deadline check
+        # has to stay a filter on the partial index walk
+        ("index", Listing.objects.open().order_by("-id")[:9]),
+        ("index by popularity", Listing.objects.open().order_by("-watcher_count", "-id")[:9]),
+        ("category_listings", Listing.objects.open().filter(category=category).order_by("-id")),
+        ("auction_view bids", Bid.objects.filter(auction=listing).order_by("-amount")[:1]),
+        ("proxy ceilings", ProxyBid.objects.filter(auction=listing).order_by("-max_amount", "updated_on")[:2]),
+        ("archived bid history", ArchivedBid.objects.filter(auction=listing).order_by("-amount", "-id")[:50]),
+        ("auction_view comments", Comment.objects.filter(auction=listing).select_related("user").order_by("-created_on", "-id")[:21]),
+        # as views.watchlist pages it
+        ("watchlist", watchlist_for(user).order_by("-id")[:13] if user else Listing.objects.none()),
+        ("expiry", Listing.objects.filter(is_active=True, ends_at__lte=timezone.now()).values_list("id", flat=True)),
+    ]
+
+
+def plan_problems(queryset):
+    problems = []
+    for line in queryset.explain().splitlines():
+        line = line.strip()
+        match = FULL_SCAN.search(line)
+        if match:
+            problems.append(f"full table scan of {match.group(1)}")
+        elif TEMP_SORT.search(line):
+            problems.append("sort in a temporary b-tree")
+    return problems
+
+
+def check_query_plans():
+    report = []
+    for name, queryset in hot_queries():
+        report.append((name, queryset.explain(), plan_problems(queryset)))
+    return report
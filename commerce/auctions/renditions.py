@@ -0,0 +1,27 @@
+import io
+
+from PIL import Image, ImageOps
+
+
+# runs in the image worker processes, so nothing here touches Django:
+# bytes in, JPEG bytes and sizes out
+
+
+def render(data, thumbnail_size, detail_size, quality):
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+    # cropped to exactly the card size, so every card lays out the same
+    thumbnail = ImageOps.fit(image, thumbnail_size, Image.Resampling.LANCZOS)
+    # scaled to fit, never enlarged
+    detail = image.copy()
+    detail.thumbnail(detail_size, Image.Resampling.LANCZOS)
+    return {
+        "thumbnail": (_jpeg(thumbnail, quality), thumbnail.size),
+        "detail": (_jpeg(detail, quality), detail.size),
+    }
+
+
+def _jpeg(image, quality):
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
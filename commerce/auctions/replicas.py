@@ -0,0 +1,76 @@
+import contextvars
+import random
+import sqlite3
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = "auctions_primary"
+
+# set by ReplicaRoutingMiddleware for the request being handled. outside a
+# request (commands, the expiry scheduler, shell) every query goes to the
+# primary
+current_route = contextvars.ContextVar("auctions_db_route", default=None)
+
+
+class RequestRoute:
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def read_from_primary():
+    # pins the rest of the request without the cookie, for reads that must
+    # not be stale, like filling a shared cache
+    route = current_route.get()
+    if route is not None:
+        route.pinned = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        route = current_route.get()
+        if route is None or route.pinned or not settings.AUCTIONS_READ_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        # a read inside a transaction has to see that transaction's writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.AUCTIONS_READ_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        route = current_route.get()
+        if route is not None:
+            # the rest of this request, and the writer's next few seconds,
+            # read their own writes from the primary
+            route.pinned = route.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas are copies of the primary, never migrated themselves
+        return db == DEFAULT_DB_ALIAS
+
+
+def copy_to_replicas(aliases=None):
+    # the local stand-in for replication, one full copy per replica
+    primary = settings.DATABASES[DEFAULT_DB_ALIAS]["NAME"]
+    for alias in aliases or settings.AUCTIONS_READ_REPLICAS:
+        copy_database(primary, settings.DATABASES[alias]["NAME"])
+
+
+def copy_database(source_path, target_path):
+    # an online backup, so the primary keeps taking writes meanwhile.
+    # readers of the target keep their snapshot until their transaction
+    # ends, the backup retries while they hold it
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
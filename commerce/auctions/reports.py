@@ -0,0 +1,139 @@
+import csv
+import heapq
+import io
+from itertools import groupby
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.http import Http404, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+
+from .archive import bids_for
+from .models import ArchivedBid, Bid, Listing, User
+
+
+# staff CSV downloads. rows come straight off values_list() in chunks and
+# go out as they are read, so memory stays flat and the first bytes leave
+# before the query has finished
+CHUNK_SIZE = 2000
+ROWS_PER_WRITE = 500
+
+CLOSED_AUCTION_COLUMNS = {
+    "id": "id",
+    "title": "title",
+    "seller": "user__username",
+    "category": "category__slug",
+    "starting_bid": "starting_bid",
+    "final_price": "current_price",
+    "bid_count": "bid_count",
+    "winner": "winner__username",
+    "ends_at": "ends_at",
+}
+BID_HISTORY_COLUMNS = {
+    "bid_id": "id",
+    "timestamp": "timestamp",
+    "bidder": "user__username",
+    "amount": "amount",
+}
+USER_ACTIVITY_COLUMNS = {
+    "bid_id": "id",
+    "timestamp": "timestamp",
+    "listing_id": "auction_id",
+    "listing": "auction__title",
+    "amount": "amount",
+    "listing_active": "auction__is_active",
+    "won": "won",
+}
+
+
+@require_safe
+@staff_member_required
+def closed_auctions(request):
+    rows = Listing.objects.filter(is_active=False).order_by("id").values_list(*CLOSED_AUCTION_COLUMNS.values())
+    return _csv_response(request, "closed-auctions.csv", CLOSED_AUCTION_COLUMNS, rows)
+
+
+@require_safe
+@staff_member_required
+def listing_bid_history(request, pk):
+    state = Listing.objects.filter(pk=pk).values_list("is_active", "bids_archived").first()
+    if state is None:
+        raise Http404("No Listing matches the given query.")
+    # id order is placing order. a bid moved to the archive between the two
+    # reads is in both, and comes out once
+    rows = heapq.merge(*(
+        bids.order_by("id").values_list(*BID_HISTORY_COLUMNS.values()).iterator(chunk_size=CHUNK_SIZE)
+        for bids in bids_for(pk, *state)
+    ), key=itemgetter(0))
+    rows = (next(group) for _, group in groupby(rows, key=itemgetter(0)))
+    return _csv_response(request, f"listing-{pk}-bids.csv", BID_HISTORY_COLUMNS, rows)
+
+
+@require_safe
+@staff_member_required
+def user_activity(request, username):
+    user_id = User.objects.filter(username=username).values_list("id", flat=True).first()
+    if user_id is None:
+        raise Http404("No User matches the given query.")
+    won = ExpressionWrapper(Q(auction__winner_id=user_id), output_field=BooleanField())
+    hot, archived = (
+        model.objects.filter(user_id=user_id).annotate(won=won).order_by("id").values_list(*USER_ACTIVITY_COLUMNS.values())
+        for model in (Bid, ArchivedBid)
+    )
+    # both are in id order, merged they stay in placing order
+    return _csv_response(request, f"user-{username}-activity.csv", USER_ACTIVITY_COLUMNS, heapq.merge(
+        hot.iterator(chunk_size=CHUNK_SIZE), archived.iterator(chunk_size=CHUNK_SIZE), key=itemgetter(0),
+    ))
+
+
+def _csv_response(request, filename, columns, rows):
+    content = _stream_csv(columns, rows)
+    if isinstance(request, ASGIRequest):
+        # an async server would otherwise read a sync iterator through
+        # sync_to_async, with a warning, instead of as it is produced
+        content = _stream_async(content)
+    response = StreamingHttpResponse(content, content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+def _stream_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # the header goes out on its own so the download starts straight away
+    writer.writerow(columns)
+    yield _drain(buffer)
+    if hasattr(rows, "iterator"):
+        rows = rows.iterator(chunk_size=CHUNK_SIZE)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % ROWS_PER_WRITE == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+async def _stream_async(chunks):
+    # each step runs the queries and CSV writing for up to ROWS_PER_WRITE
+    # rows on the request's sync thread, where its cursors live
+    step = sync_to_async(next)
+    while (chunk := await step(chunks, None)) is not None:
+        yield chunk
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
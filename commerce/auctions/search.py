@@ -0,0 +1,137 @@
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Listing
+from .pagination import CursorPage, CursorPaginator
+
+
+FTS_TABLE = "auctions_listing_fts"
+
+# recreated after every migrate if missing: sqlite drops a table's triggers
+# whenever a migration rebuilds auctions_listing
+TRIGGERS = {
+    "auctions_listing_fts_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS auctions_listing_fts_insert AFTER INSERT ON auctions_listing BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+    """,
+    "auctions_listing_fts_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS auctions_listing_fts_delete AFTER DELETE ON auctions_listing BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+    """,
+    "auctions_listing_fts_update": f"""
+        CREATE TRIGGER IF NOT EXISTS auctions_listing_fts_update AFTER UPDATE OF title, description ON auctions_listing BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+    """,
+}
+
+WORD = re.compile(r"\w+")
+
+
+def search_available(using="default"):
+    return connections[using].vendor == "sqlite"
+
+
+def match_expression(text):
+    # every word is quoted so user input can never be read as FTS5 syntax,
+    # and the last one is a prefix so half-typed words still match
+    words = WORD.findall(text)
+    if not words:
+        return ""
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+class SearchPaginator(CursorPaginator):
+    # pages through FTS5 matches best-first, keyed on (rank, id)
+
+    def __init__(self, query, per_page, category=None, include_closed=False):
+        super().__init__(None, per_page, ordering=["rank", "id"])
+        self.match = match_expression(query)
+        self.category = category
+        self.include_closed = include_closed
+
+    def fetch(self, ordering, position, limit):
+        if not self.match:
+            return []
+        descending = ordering[0].startswith("-")
+        op, direction = ("<", "DESC") if descending else (">", "ASC")
+        sql = [
+            f"SELECT l.id, {FTS_TABLE}.rank FROM {FTS_TABLE}",
+            f"JOIN {Listing._meta.db_table} l ON l.id = {FTS_TABLE}.rowid",
+            f"WHERE {FTS_TABLE} MATCH %s",
+        ]
+        params = [self.match]
+        if not self.include_closed:
+            sql.append("AND l.is_active AND (l.ends_at IS NULL OR l.ends_at > %s)")
+            params.append(connection.ops.adapt_datetimefield_value(timezone.now()))
+        if self.category is not None:
+            sql.append("AND l.category_id = %s")
+            params.append(self.category.pk)
+        if position is not None:
+            rank, pk = float(position[0]), int(position[1])
+            sql.append(f"AND ({FTS_TABLE}.rank {op} %s OR ({FTS_TABLE}.rank = %s AND l.id {op} %s))")
+            params += [rank, rank, pk]
+        sql.append(f"ORDER BY {FTS_TABLE}.rank {direction}, l.id {direction} LIMIT %s")
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(" ".join(sql), params)
+            return [{"id": pk, "rank": rank} for pk, rank in cursor.fetchall()]
+
+
+def search_listings(query, cursor=None, per_page=9, category=None, include_closed=False):
+    if search_available():
+        page = SearchPaginator(query, per_page, category, include_closed).page(cursor)
+        listings = Listing.objects.in_bulk([row["id"] for row in page])
+        page.object_list = [listings[row["id"]] for row in page if row["id"] in listings]
+        return page
+
+    # no FTS5 on this backend, fall back to the old LIKE scan
+    words = WORD.findall(query)
+    if not words:
+        return CursorPage([])
+    listings = Listing.objects.all()
+    for word in words:
+        listings = listings.filter(Q(title__icontains=word) | Q(description__icontains=word))
+    if not include_closed:
+        listings = listings.open()
+    if category is not None:
+        listings = listings.filter(category=category)
+    return CursorPaginator(listings, per_page).page(cursor)
+
+
+def search_ids_sql(query):
+    # "id IN (...)" filter for querysets, used by the admin search box
+    return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match_expression(query)]
+
+
+def ensure_search_index(using="default"):
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name, type FROM sqlite_master WHERE name LIKE %s", [f"{FTS_TABLE}%"])
+        existing = {name for name, kind in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            return
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+    if missing:
+        rebuild_search_index(using)
+
+
+def rebuild_search_index(using="default", optimize=False):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        if optimize:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
@@ -0,0 +1,101 @@
+import random
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import User, Category, Listing, Bid, Comment
+from .comments import recount_comments
+from .watchlist import recount_watchers
+
+
+BATCH_SIZE = 5000
+
+
+def seed(users=1000, listings=10000, bids_per_listing=10, comments_per_listing=3,
+         watched_per_user=10, active_ratio=0.2, random_seed=0):
+    # bulk-loads a synthetic dataset for benchmarks and query plan checks.
+    # passwords are unusable on purpose, hashing would dominate the run time
+    rng = random.Random(random_seed)
+    with transaction.atomic():
+        first_user = User.objects.count()
+        User.objects.bulk_create(
+            (User(username=f"seed{first_user + i}", password="!") for i in range(users)),
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = list(User.objects.values_list("id", flat=True))
+        category_ids = list(Category.objects.values_list("id", flat=True)) or [None]
+
+        first_listing = (Listing.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+        listing_rows = []
+        for i in range(listings):
+            start = Decimal(rng.randint(1, 500))
+            listing_rows.append(Listing(
+                title=f"Seeded item {i}",
+                description="Lorem ipsum dolor sit amet " * 5,
+                starting_bid=start,
+                current_price=start,
+                category_id=rng.choice(category_ids),
+                user_id=rng.choice(user_ids),
+                is_active=rng.random() < active_ratio,
+            ))
+        Listing.objects.bulk_create(listing_rows, batch_size=BATCH_SIZE)
+        seeded = Listing.objects.filter(id__gte=first_listing)
+        listing_ids = list(seeded.values_list("id", flat=True))
+
+        # the ORM spends ~30us per object in bulk_create, which adds up to
+        # minutes at millions of bids, so the big tables go in as raw rows
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        bids = []
+        summaries = []
+        for listing in seeded.values("id", "current_price").iterator():
+            price = listing["current_price"]
+            bidder = None
+            count = rng.randint(0, bids_per_listing * 2)
+            for _ in range(count):
+                price += rng.randint(1, 20)
+                bidder = rng.choice(user_ids)
+                bids.append((str(price), now, bidder, listing["id"]))
+            summaries.append((str(price), str(price) if count else None, bidder, count, listing["id"]))
+            if len(bids) >= BATCH_SIZE:
+                insert_rows(Bid, ["amount", "timestamp", "user_id", "auction_id"], bids)
+                bids = []
+        insert_rows(Bid, ["amount", "timestamp", "user_id", "auction_id"], bids)
+
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {Listing._meta.db_table} SET current_price = %s, top_bid = %s, "
+                "top_bidder_id = %s, bid_count = %s WHERE id = %s",
+                summaries,
+            )
+
+        insert_rows(Comment, ["body", "created_on", "user_id", "auction_id"], [
+            ("Seeded comment", now, rng.choice(user_ids), listing_id)
+            for listing_id in listing_ids
+            for _ in range(rng.randint(0, comments_per_listing * 2))
+        ])
+
+        seeded_users = user_ids[-users:] if users else []
+        insert_rows(Listing.favoured.through, ["user_id", "listing_id"], [
+            (user_id, listing_id)
+            for user_id in seeded_users
+            for listing_id in rng.sample(listing_ids, min(watched_per_user, len(listing_ids)))
+        ])
+        recount_watchers(seeded)
+        recount_comments(seeded)
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def insert_rows(model, columns, rows):
+    if not rows:
+        return
+    sql = (
+        f"INSERT INTO {model._meta.db_table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})"
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(sql, rows[start:start + BATCH_SIZE])
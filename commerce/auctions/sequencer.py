@@ -0,0 +1,136 @@
+import atexit
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .bidding import BidRejected, resolve_proxies
+from .events import publish_bid
+from .page_cache import purge_listings
+from .models import Listing, Bid
+
+
+_STOP = object()
+
+_sequencer = None
+_sequencer_lock = threading.Lock()
+
+
+class BidSequencer:
+    # every listing id maps to exactly one shard, and every shard has exactly
+    # one worker thread, so bids for a listing are validated strictly in
+    # arrival order. while a worker is committing, new bids pile up in its
+    # queue and go out together in the next transaction (group commit)
+
+    def __init__(self, shards=4, batch_size=50):
+        self.batch_size = batch_size
+        self.batches = 0
+        self._queues = [queue.Queue() for _ in range(shards)]
+        self._workers = [
+            threading.Thread(target=self._run, args=(q,), name=f"bid-sequencer-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, auction_id, user, amount):
+        future = Future()
+        self._queues[auction_id % len(self._queues)].put((auction_id, user, amount, future))
+        return future
+
+    def close(self):
+        for q in self._queues:
+            q.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+
+    def _run(self, q):
+        try:
+            stopping = False
+            while not stopping:
+                item = q.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._commit(batch)
+        finally:
+            connection.close()
+
+    def _commit(self, batch):
+        batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes = []
+        try:
+            with transaction.atomic():
+                # the lock makes the in-memory prices authoritative for the
+                # batch even if another process is bidding through place_bid
+                prices = dict(
+                    Listing.objects.open().select_for_update()
+                    .filter(pk__in={item[0] for item in batch})
+                    .values_list("pk", "current_price")
+                )
+                accepted = []
+                for auction_id, user, amount, future in batch:
+                    price = prices.get(auction_id)
+                    if price is None:
+                        outcomes.append((future, BidRejected.closed()))
+                    elif amount <= price:
+                        outcomes.append((future, BidRejected.outbid(price)))
+                    else:
+                        prices[auction_id] = amount
+                        bid = Bid(amount=amount, user=user, auction_id=auction_id)
+                        accepted.append(bid)
+                        outcomes.append((future, bid))
+
+                Bid.objects.bulk_create(accepted)
+                # accepted bids are in ascending order per listing, the last one leads
+                leaders = {bid.auction_id: bid for bid in accepted}
+                counts = Counter(bid.auction_id for bid in accepted)
+                for auction_id, bid in leaders.items():
+                    Listing.objects.filter(pk=auction_id).update(
+                        current_price=bid.amount,
+                        top_bid=bid.amount,
+                        top_bidder=bid.user,
+                        bid_count=F("bid_count") + counts[auction_id],
+                        version=F("version") + 1,
+                    )
+                    resolve_proxies(auction_id, bid.amount, bid.user_id)
+                purge_listings(leaders)
+        except Exception as e:
+            for item in batch:
+                item[3].set_exception(e)
+            return
+
+        self.batches += 1
+        for future, outcome in outcomes:
+            if isinstance(outcome, BidRejected):
+                future.set_exception(outcome)
+            else:
+                publish_bid(outcome)
+                future.set_result(outcome)
+
+
+def get_sequencer():
+    global _sequencer
+    with _sequencer_lock:
+        if _sequencer is None:
+            _sequencer = BidSequencer(
+                shards=settings.AUCTIONS_BID_SEQUENCER_SHARDS,
+                batch_size=settings.AUCTIONS_BID_SEQUENCER_BATCH_SIZE,
+            )
+            atexit.register(_sequencer.close)
+        return _sequencer
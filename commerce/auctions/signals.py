@@ -0,0 +1,84 @@
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, post_migrate, m2m_changed
+from django.dispatch import receiver
+
+from .categories import invalidate_categories
+from .metrics import instrument_connection
+from .models import Category, Comment, Listing
+from .page_cache import purge_listing
+from .search import ensure_search_index
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, **kwargs):
+    invalidate_categories()
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def listing_changed(sender, instance, **kwargs):
+    purge_listing(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # comments only show on the listing's own page
+    purge_listing(instance.auction_id, lists=False)
+
+
+@receiver(post_save, sender=Comment)
+def comment_added(sender, instance, created, **kwargs):
+    if created:
+        Listing.objects.filter(pk=instance.auction_id).update(comment_count=F("comment_count") + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_removed(sender, instance, **kwargs):
+    Listing.objects.filter(pk=instance.auction_id).update(comment_count=F("comment_count") - 1)
+
+
+@receiver(m2m_changed, sender=Listing.favoured.through)
+def watchers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # add only reports rows that were really inserted, but remove reports
+    # whatever was asked for, so look up what actually exists beforehand
+    if action == "pre_remove":
+        instance._unwatched = _existing_links(sender, instance, reverse, pk_set)
+    elif action == "pre_clear":
+        instance._unwatched = _existing_links(sender, instance, reverse, None)
+    elif action == "post_add":
+        _adjust_watcher_count(instance, reverse, pk_set, 1)
+    elif action in ("post_remove", "post_clear"):
+        _adjust_watcher_count(instance, reverse, instance.__dict__.pop("_unwatched", ()), -1)
+
+
+def _existing_links(through, instance, reverse, pk_set):
+    # reverse means the instance is a User and pk_set holds listing ids
+    if reverse:
+        links, column = through.objects.filter(user=instance), "listing_id"
+    else:
+        links, column = through.objects.filter(listing=instance), "user_id"
+    if pk_set is not None:
+        links = links.filter(**{f"{column}__in": pk_set})
+    return set(links.values_list(column, flat=True))
+
+
+def _adjust_watcher_count(instance, reverse, pks, delta):
+    if not pks:
+        return
+    if reverse:
+        Listing.objects.filter(pk__in=pks).update(watcher_count=F("watcher_count") + delta)
+    else:
+        Listing.objects.filter(pk=instance.pk).update(watcher_count=F("watcher_count") + delta * len(pks))
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == "auctions":
+        ensure_search_index(using)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    # request metrics count queries on every connection, whichever thread
+    # opened it (auctions.metrics.count_query)
+    instrument_connection(connection)
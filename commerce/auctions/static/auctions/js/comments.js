@@ -0,0 +1,30 @@
+// "load more" on the comment thread: fetch the next page as a fragment and
+// put it where the link was, the fragment brings its own next link
+document.addEventListener('DOMContentLoaded', function() {
+    const comments = document.getElementById('comments');
+    if (!comments) {
+        return;
+    }
+    comments.addEventListener('click', function(event) {
+        const link = event.target.closest('.load-more');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        link.classList.add('disabled');
+        fetch(link.href)
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            })
+            .then(function(html) {
+                link.insertAdjacentHTML('beforebegin', html);
+                link.remove();
+            })
+            .catch(function() {
+                link.classList.remove('disabled');
+            });
+    });
+});
@@ -0,0 +1,94 @@
+// keeps the price and bid count on an auction page current. uses
+// Server-Sent Events when the site runs under ASGI and falls back to
+// long-polling when the stream is refused or keeps failing
+document.addEventListener('DOMContentLoaded', function() {
+    const auction = document.getElementById('auction');
+    if (!auction) {
+        return;
+    }
+    let lastEventId = parseInt(auction.dataset.lastEventId, 10);
+    let bidCount = parseInt(auction.dataset.bidCount, 10);
+
+    function showBid(data) {
+        document.getElementById('current-price').textContent = data.price;
+        const minimum = document.getElementById('minimum-price');
+        if (minimum) {
+            minimum.textContent = data.price;
+        }
+        // bid events only say one more bid landed, snapshots carry the total
+        bidCount = data.bid_count !== undefined ? data.bid_count : bidCount + 1;
+        let summary = bidCount + (bidCount === 1 ? ' bid' : ' bids');
+        if (data.bidder) {
+            summary += ', leading: ' + data.bidder;
+        }
+        document.getElementById('bid-summary').textContent = summary;
+    }
+
+    function showClosed() {
+        document.getElementById('auction-closed').hidden = false;
+        auction.querySelectorAll('form button[name="bid"]').forEach(function(button) {
+            button.disabled = true;
+        });
+    }
+
+    function handle(type, data, id) {
+        lastEventId = Math.max(lastEventId, id);
+        if (type === 'snapshot') {
+            showBid(data);
+            if (!data.is_active) {
+                showClosed();
+            }
+        } else if (type === 'bid') {
+            showBid(data);
+        } else if (type === 'closed') {
+            showClosed();
+            return false;
+        }
+        return true;
+    }
+
+    function poll() {
+        fetch(auction.dataset.pollUrl + '?since=' + lastEventId)
+            .then(function(response) {
+                if (response.status === 204) {
+                    return null;
+                }
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function(event) {
+                if (event === null || handle(event.type, event.data, event.id)) {
+                    poll();
+                }
+            })
+            .catch(function() {
+                setTimeout(poll, 5000);
+            });
+    }
+
+    if (!window.EventSource) {
+        poll();
+        return;
+    }
+    const source = new EventSource(auction.dataset.eventsUrl);
+    let failures = 0;
+    ['snapshot', 'bid', 'closed'].forEach(function(type) {
+        source.addEventListener(type, function(event) {
+            failures = 0;
+            if (!handle(type, JSON.parse(event.data), parseInt(event.lastEventId, 10) || 0)) {
+                source.close();
+            }
+        });
+    });
+    source.onerror = function() {
+        // a 204 (WSGI deployment) closes the stream for good, repeated
+        // reconnect failures are treated the same way
+        failures += 1;
+        if (source.readyState === EventSource.CLOSED || failures >= 3) {
+            source.close();
+            poll();
+        }
+    };
+});
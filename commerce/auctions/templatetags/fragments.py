@@ -0,0 +1,30 @@
+from django import template
+
+from ..fragments import cached_fragment
+
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        return cached_fragment(self.name, vary_on, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def fragment(parser, token):
+    # {% fragment "name" auction.id auction.version %}...{% endfragment %}
+    # like {% cache %}, but without a timeout argument and with hit/miss
+    # counts, see auctions/fragments.py
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a name and at least one value to vary on")
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, bits[1].strip("\"'"), [parser.compile_filter(bit) for bit in bits[2:]])
@@ -1,8 +1,56 @@
-from django.test import TestCase, Client
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import warnings
+from contextlib import closing
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, AsyncClient, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import authenticate
-from .models import User, Category, Listing, Bid, Comment
-from .forms import NewAuctionForm, BidForm, CommentForm
+from PIL import Image
+from asgiref.sync import iscoroutinefunction
+from .models import User, Category, Listing, Bid, ArchivedBid, Comment
+from .archive import archive_closed_bids
+from .images import submit_renditions
+from .forms import NewAuctionForm, BidForm, ProxyBidForm, CommentForm
+from .bidding import BidRejected, place_bid, set_proxy_bid
+from .sequencer import BidSequencer
+from .query_plans import hot_queries, plan_problems
+from .seed import seed
+from .pagination import CursorPaginator, MergedCursorPaginator
+from .categories import get_categories, invalidate_categories
+from .watchlist import is_watching, watched_ids
+from .search import ensure_search_index
+from .expiry import ExpiryScheduler, close_expired_auctions
+from .events import EventHub, hub
+from .fragments import fragment_stats, reset_fragment_stats
+from .page_cache import cache_anonymous_page
+from .metrics import observe, render_prometheus, reset_metrics
+from . import views
+from .middleware import MetricsMiddleware, ReplicaRoutingMiddleware
+from .replicas import PIN_COOKIE, ReplicaRouter, copy_database
+from .management.commands import bench_views
 
 
 class UserModelTest(TestCase):
@@ -265,6 +313,8 @@ class FormTests(TestCase):
         self.assertFalse(form.is_valid())
 
 
+# these check what the views themselves render and query
+@override_settings(AUCTIONS_PAGE_CACHE=False)
 class ViewTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -403,4 +453,1805 @@ class AuctionLogicTests(TestCase):
         Bid.objects.create(amount=175.00, user=self.bidder1, auction=self.listing)
         
         highest_bid = self.listing.bids.first()
-        self.assertEqual(highest_bid.amount, 200.00)
\ No newline at end of file
+        self.assertEqual(highest_bid.amount, 200.00)
+
+class PlaceBidTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.listing = Listing.objects.create(
+            title='Auction Item',
+            description='Test auction',
+            starting_bid=100.00,
+            current_price=100.00,
+            user=self.seller,
+        )
+
+    def test_place_bid_updates_price(self):
+        bid = place_bid(self.listing.pk, self.bidder, Decimal('150.00'))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal('150.00'))
+        self.assertEqual(bid.auction_id, self.listing.pk)
+
+    def test_place_bid_outbid(self):
+        place_bid(self.listing.pk, self.bidder, Decimal('150.00'))
+        with self.assertRaises(BidRejected) as cm:
+            place_bid(self.listing.pk, self.seller, Decimal('150.00'))
+        self.assertEqual(cm.exception.current_price, Decimal('150.00'))
+        self.assertEqual(self.listing.bids.count(), 1)
+
+    def test_place_bid_closed_auction(self):
+        self.listing.is_active = False
+        self.listing.save()
+        with self.assertRaises(BidRejected):
+            place_bid(self.listing.pk, self.bidder, Decimal('150.00'))
+        self.assertEqual(self.listing.bids.count(), 0)
+
+    def test_stale_form_bid_is_rejected(self):
+        # the form validated against a price that has since moved
+        self.client.login(username='bidder', password='pass123')
+        stale = Listing.objects.get(pk=self.listing.pk)
+        place_bid(self.listing.pk, self.seller, Decimal('200.00'))
+        form = BidForm(data={'amount': 150.00}, auction=stale)
+        self.assertTrue(form.is_valid())
+        response = self.client.post(reverse('auction_view', args=[self.listing.pk]), {'bid': '', 'amount': '150.00'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'higher than $200.00')
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal('200.00'))
+
+
+class ConcurrentBidTests(TransactionTestCase):
+    threads = 8
+    bids_per_thread = 25
+
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidders = [
+            User.objects.create_user(username=f'bidder{i}', password='pass123')
+            for i in range(self.threads)
+        ]
+        self.listing = Listing.objects.create(
+            title='Hot Item',
+            description='Everyone wants it',
+            starting_bid=1.00,
+            current_price=1.00,
+            user=self.seller,
+        )
+
+    def hammer(self, bidder, amounts, accepted, barrier):
+        barrier.wait()
+        try:
+            for amount in amounts:
+                try:
+                    place_bid(self.listing.pk, bidder, amount)
+                except BidRejected:
+                    continue
+                accepted.append(amount)
+        finally:
+            connection.close()
+
+    def test_concurrent_bids_on_one_listing(self):
+        accepted = []
+        barrier = threading.Barrier(self.threads)
+        workers = []
+        for i, bidder in enumerate(self.bidders):
+            # interleave amounts so threads constantly race each other
+            amounts = [Decimal(2 + n * self.threads + i) for n in range(self.bids_per_thread)]
+            workers.append(threading.Thread(target=self.hammer, args=(bidder, amounts, accepted, barrier)))
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.listing.refresh_from_db()
+        highest = max(accepted)
+        self.assertEqual(self.listing.current_price, highest)
+        self.assertEqual(self.listing.bids.count(), len(accepted))
+        # every accepted bid beat the one committed before it
+        amounts = list(self.listing.bids.order_by('id').values_list('amount', flat=True))
+        self.assertEqual(amounts, sorted(amounts))
+        self.assertEqual(len(set(amounts)), len(amounts))
+
+
+class BidSequencerTests(TransactionTestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.listing = Listing.objects.create(
+            title='Hot Item',
+            description='Everyone wants it',
+            starting_bid=100.00,
+            current_price=100.00,
+            user=self.seller,
+        )
+        self.sequencer = BidSequencer(shards=2, batch_size=20)
+
+    def tearDown(self):
+        self.sequencer.close()
+
+    def test_bids_validated_in_arrival_order(self):
+        futures = [
+            self.sequencer.submit(self.listing.pk, self.bidder, Decimal(amount))
+            for amount in ('150.00', '140.00', '200.00', '200.00')
+        ]
+        self.assertEqual(futures[0].result(timeout=10).amount, Decimal('150.00'))
+        self.assertRaises(BidRejected, futures[1].result, timeout=10)
+        self.assertEqual(futures[2].result(timeout=10).amount, Decimal('200.00'))
+        self.assertRaises(BidRejected, futures[3].result, timeout=10)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal('200.00'))
+        self.assertEqual(self.listing.bids.count(), 2)
+
+    def test_closed_listing_rejected(self):
+        Listing.objects.filter(pk=self.listing.pk).update(is_active=False)
+        future = self.sequencer.submit(self.listing.pk, self.bidder, Decimal('150.00'))
+        self.assertRaises(BidRejected, future.result, timeout=10)
+
+    def test_bursts_are_group_committed(self):
+        futures = [
+            self.sequencer.submit(self.listing.pk, self.bidder, Decimal(101 + n))
+            for n in range(200)
+        ]
+        bids = [future.result(timeout=10) for future in futures]
+        self.assertTrue(all(bid.pk for bid in bids))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal(300))
+        self.assertEqual(self.listing.bid_count, 200)
+        self.assertEqual(self.listing.top_bidder, self.bidder)
+        self.assertLess(self.sequencer.batches, len(bids))
+
+    def test_ceiling_answers_a_batch_once(self):
+        set_proxy_bid(self.listing.pk, self.seller, Decimal('500.00'))
+        futures = [self.sequencer.submit(self.listing.pk, self.bidder, Decimal(150 + n)) for n in range(5)]
+        for future in futures:
+            future.result(timeout=10)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal('154.01'))
+        self.assertEqual(self.listing.top_bidder, self.seller)
+
+    @override_settings(AUCTIONS_BID_SEQUENCER=True)
+    def test_view_uses_sequencer(self):
+        self.client.login(username='bidder', password='pass123')
+        with mock.patch('auctions.sequencer.get_sequencer', return_value=self.sequencer):
+            response = self.client.post(reverse('auction_view', args=[self.listing.pk]), {'bid': '', 'amount': '150.00'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.sequencer.batches, 1)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal('150.00'))
+
+
+    @override_settings(AUCTIONS_BID_SEQUENCER=True)
+    def test_timed_out_bid_is_withdrawn(self):
+        self.client.login(username='bidder', password='pass123')
+        stalled = BidSequencer(shards=1)
+        self.addCleanup(stalled.close)
+        # a batch that takes longer than the timeout holds up the queue
+        release = threading.Event()
+        commit = stalled._commit
+        stalled._commit = lambda batch: (release.wait(10), commit(batch))
+        first = stalled.submit(self.listing.pk, self.bidder, Decimal('120.00'))
+        with mock.patch('auctions.sequencer.get_sequencer', return_value=stalled), \
+                mock.patch('auctions.bidding.SEQUENCER_TIMEOUT', 0.05):
+            response = self.client.post(
+                reverse('auction_view', args=[self.listing.pk]), {'bid': '', 'amount': '150.00'}, follow=True,
+            )
+        self.assertContains(response, 'please try again')
+        release.set()
+        self.assertEqual(first.result(timeout=10).amount, Decimal('120.00'))
+        stalled.close()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal('120.00'))
+        self.assertEqual(self.listing.bids.count(), 1)
+
+
+class BidSummaryTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidder1 = User.objects.create_user(username='bidder1', password='pass123')
+        self.bidder2 = User.objects.create_user(username='bidder2', password='pass123')
+        self.listing = Listing.objects.create(
+            title='Auction Item',
+            description='Test auction',
+            starting_bid=100.00,
+            current_price=100.00,
+            user=self.seller,
+        )
+
+    def test_place_bid_maintains_summary(self):
+        place_bid(self.listing.pk, self.bidder1, Decimal('150.00'))
+        place_bid(self.listing.pk, self.bidder2, Decimal('175.00'))
+        with self.assertRaises(BidRejected):
+            place_bid(self.listing.pk, self.bidder1, Decimal('160.00'))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 2)
+        self.assertEqual(self.listing.top_bid, Decimal('175.00'))
+        self.assertEqual(self.listing.top_bidder, self.bidder2)
+
+    def test_backfill_migration(self):
+        Bid.objects.create(amount=150.00, user=self.bidder1, auction=self.listing)
+        Bid.objects.create(amount=200.00, user=self.bidder2, auction=self.listing)
+        empty = Listing.objects.create(
+            title='No bids', description='Test', starting_bid=10, current_price=10, user=self.seller,
+        )
+        backfill = import_module('auctions.migrations.0004_listing_bid_summary').backfill_bid_summary
+        backfill(apps, None)
+        self.listing.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 2)
+        self.assertEqual(self.listing.top_bid, Decimal('200.00'))
+        self.assertEqual(self.listing.top_bidder, self.bidder2)
+        self.assertEqual(empty.bid_count, 0)
+        self.assertIsNone(empty.top_bidder)
+
+    def test_end_auction_uses_leading_bidder(self):
+        place_bid(self.listing.pk, self.bidder1, Decimal('150.00'))
+        self.client.login(username='seller', password='pass123')
+        self.client.get(reverse('end_auction', args=[self.listing.pk]))
+        self.listing.refresh_from_db()
+        self.assertFalse(self.listing.is_active)
+        self.assertEqual(self.listing.winner, self.bidder1)
+
+    def test_end_auction_is_one_conditional_update(self):
+        place_bid(self.listing.pk, self.bidder1, Decimal('150.00'))
+        self.client.login(username='seller', password='pass123')
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('end_auction', args=[self.listing.pk]))
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "auctions_listing"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"top_bidder_id"', updates[0])
+        self.assertEqual(hub.latest(self.listing.pk).type, 'closed')
+        self.assertIn('bidder1', hub.latest(self.listing.pk).data)
+
+        # closing again changes nothing
+        closed_version = Listing.objects.get(pk=self.listing.pk).version
+        self.client.get(reverse('end_auction', args=[self.listing.pk]))
+        self.assertEqual(Listing.objects.get(pk=self.listing.pk).version, closed_version)
+
+    def test_auction_view_queries_do_not_touch_bids(self):
+        place_bid(self.listing.pk, self.bidder1, Decimal('150.00'))
+        url = reverse('auction_view', args=[self.listing.pk])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertContains(response, '1 bid,')
+        self.assertFalse(any('auctions_bid' in q['sql'] for q in ctx.captured_queries))
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(users=50, listings=3000, bids_per_listing=5)
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in hot_queries():
+            with self.subTest(name):
+                self.assertEqual(plan_problems(queryset), [])
+
+    def test_full_scan_is_reported(self):
+        problems = plan_problems(Listing.objects.filter(title='Seeded item 1'))
+        self.assertEqual(problems, ['full table scan of auctions_listing'])
+
+
+@override_settings(AUCTIONS_PAGE_CACHE=False)
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.category, _ = Category.objects.get_or_create(
+            name='Electronics',
+            defaults={'slug': 'electronics'}
+        )
+        self.listings = [
+            Listing.objects.create(
+                title=f'Item {i}',
+                description='Test',
+                starting_bid=i + 1,
+                current_price=i + 1,
+                user=self.seller,
+                category=self.category,
+            )
+            for i in range(20)
+        ]
+        Listing.objects.filter(pk=self.listings[5].pk).update(is_active=False)
+
+    def ids(self, response):
+        return [listing.id for listing in response.context['object_list']]
+
+    def test_index_pages_forward_and_back(self):
+        expected = [listing.id for listing in reversed(self.listings) if listing != self.listings[5]]
+        first = self.client.get(reverse('index'))
+        self.assertEqual(self.ids(first), expected[:9])
+        self.assertFalse(first.context['page_obj'].has_previous())
+
+        second = self.client.get(reverse('index'), {'cursor': first.context['page_obj'].next_cursor})
+        self.assertEqual(self.ids(second), expected[9:18])
+
+        third = self.client.get(reverse('index'), {'cursor': second.context['page_obj'].next_cursor})
+        self.assertEqual(self.ids(third), expected[18:])
+        self.assertFalse(third.context['page_obj'].has_next())
+
+        back = self.client.get(reverse('index'), {'cursor': third.context['page_obj'].previous_cursor})
+        self.assertEqual(self.ids(back), expected[9:18])
+        self.assertTrue(back.context['page_obj'].has_next())
+
+    def test_no_count_or_offset_queries(self):
+        first = self.client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('index'), {'cursor': first.context['page_obj'].next_cursor})
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_tampered_cursor_is_404(self):
+        response = self.client.get(reverse('index'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_category_listings_paginated(self):
+        response = self.client.get(reverse('category_listings', args=['electronics']))
+        self.assertEqual(len(response.context['listings']), 9)
+        self.assertContains(response, 'Electronics Listings')
+        self.assertTrue(response.context['page_obj'].has_next())
+
+    def test_compound_ordering(self):
+        Listing.objects.filter(pk__in=[l.pk for l in self.listings[:4]]).update(current_price=50)
+        paginator = CursorPaginator(Listing.objects.filter(is_active=True), 3, ['-current_price', '-id'])
+        seen = []
+        page = paginator.page()
+        while True:
+            seen.extend(page.object_list)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        expected = list(Listing.objects.filter(is_active=True).order_by('-current_price', '-id'))
+        self.assertEqual(seen, expected)
+
+
+class CategoryRegistryTests(TestCase):
+    def setUp(self):
+        invalidate_categories()
+
+    def test_registry_is_built_once(self):
+        get_categories()
+        with self.assertNumQueries(0):
+            categories = get_categories()
+        self.assertIsInstance(categories, tuple)
+        self.assertIn('electronics', [category.slug for category in categories])
+
+    def test_saving_a_category_invalidates(self):
+        get_categories()
+        Category.objects.create(name='Antiques', slug='antiques')
+        self.assertIn('antiques', [category.slug for category in get_categories()])
+
+    def test_deleting_a_category_invalidates(self):
+        get_categories()
+        Category.objects.get(slug='books').delete()
+        self.assertNotIn('books', [category.slug for category in get_categories()])
+
+    def test_other_worker_change_is_picked_up(self):
+        get_categories()
+        # a change committed elsewhere only shows up as a new shared version
+        Category.objects.bulk_create([Category(name='Stamps', slug='stamps')])
+        self.assertNotIn('stamps', [category.slug for category in get_categories()])
+        invalidate_categories()
+        self.assertIn('stamps', [category.slug for category in get_categories()])
+
+    def test_header_renders_without_category_query(self):
+        self.client.get(reverse('login'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('login'))
+        self.assertContains(response, 'electronics')
+        self.assertFalse(any('auctions_category' in q['sql'] for q in ctx.captured_queries))
+
+
+class CategoriesViewTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        invalidate_categories()
+
+    def add_listings(self, slug, active, closed):
+        category = Category.objects.get(slug=slug)
+        for i in range(active + closed):
+            Listing.objects.create(
+                title=f'{slug} {i}', description='Test', starting_bid=1, current_price=1,
+                user=self.seller, category=category, is_active=i < active,
+            )
+
+    def test_counts_split_active_and_total(self):
+        self.add_listings('books', active=2, closed=3)
+        response = self.client.get(reverse('categories'))
+        books = next(c for c in response.context['categories'] if c.slug == 'books')
+        self.assertEqual(books.active_listing_count, 2)
+        self.assertEqual(books.listing_count, 5)
+
+    def test_query_count_is_constant(self):
+        self.client.get(reverse('categories'))
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(reverse('categories'))
+        for i in range(10):
+            Category.objects.create(name=f'Extra {i}', slug=f'extra-{i}')
+        self.add_listings('extra-1', active=1, closed=1)
+        self.client.get(reverse('categories'))
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(reverse('categories'))
+        self.assertEqual(len(before), len(after))
+
+
+class WatchlistTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.user = User.objects.create_user(username='watcher', password='pass123')
+        self.listings = [
+            Listing.objects.create(
+                title=f'Item {i}', description='Test', starting_bid=1, current_price=1, user=self.seller,
+            )
+            for i in range(15)
+        ]
+
+    def test_watcher_count_follows_add_and_remove(self):
+        listing = self.listings[0]
+        listing.favoured.add(self.user, self.seller)
+        listing.favoured.add(self.user)
+        listing.refresh_from_db()
+        self.assertEqual(listing.watcher_count, 2)
+
+        listing.favoured.remove(self.user)
+        listing.favoured.remove(self.user)
+        listing.refresh_from_db()
+        self.assertEqual(listing.watcher_count, 1)
+
+        listing.favoured.clear()
+        listing.refresh_from_db()
+        self.assertEqual(listing.watcher_count, 0)
+
+    def test_watcher_count_from_user_side(self):
+        self.user.favoured.add(*self.listings[:3])
+        self.user.favoured.remove(self.listings[0], self.listings[5])
+        counts = dict(Listing.objects.values_list('id', 'watcher_count'))
+        self.assertEqual(counts[self.listings[0].id], 0)
+        self.assertEqual(counts[self.listings[1].id], 1)
+        self.assertEqual(counts[self.listings[5].id], 0)
+        self.user.favoured.clear()
+        self.assertFalse(Listing.objects.filter(watcher_count__gt=0).exists())
+
+    def test_toggle_watch(self):
+        self.client.login(username='watcher', password='pass123')
+        self.client.get(reverse('add_to_watchlist', args=[self.listings[0].pk]))
+        self.assertTrue(is_watching(self.user, self.listings[0].pk))
+        self.client.get(reverse('add_to_watchlist', args=[self.listings[0].pk]))
+        self.assertFalse(is_watching(self.user, self.listings[0].pk))
+
+    def test_watched_ids_in_one_query(self):
+        self.user.favoured.add(self.listings[1], self.listings[4])
+        with self.assertNumQueries(1):
+            ids = watched_ids(self.user, [listing.id for listing in self.listings])
+        self.assertEqual(ids, {self.listings[1].id, self.listings[4].id})
+
+    def test_index_marks_watched_listings(self):
+        self.user.favoured.add(self.listings[-1])
+        self.client.login(username='watcher', password='pass123')
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['watched_ids'], {self.listings[-1].id})
+
+    def test_watchlist_is_paginated(self):
+        self.user.favoured.add(*self.listings)
+        self.client.login(username='watcher', password='pass123')
+        response = self.client.get(reverse('watchlist'))
+        self.assertEqual(len(response.context['listings']), 12)
+        response = self.client.get(reverse('watchlist'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(response.context['listings']), 3)
+
+    def test_watchlist_newest_watched_first(self):
+        self.user.favoured.add(self.listings[3])
+        self.user.favoured.add(self.listings[1])
+        self.user.favoured.add(self.listings[7])
+        self.client.login(username='watcher', password='pass123')
+        response = self.client.get(reverse('watchlist'))
+        self.assertEqual(
+            [listing.id for listing in response.context['listings']],
+            [self.listings[7].id, self.listings[1].id, self.listings[3].id],
+        )
+
+    def test_full_watchlist_page_query_count(self):
+        self.user.favoured.add(*self.listings)
+        self.client.login(username='watcher', password='pass123')
+        self.client.get(reverse('watchlist'))
+        # session, user, one page of cards: nothing per card
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('watchlist'))
+        self.assertEqual(len(response.context['listings']), 12)
+
+    def test_sort_by_popularity(self):
+        self.listings[2].favoured.add(self.user, self.seller)
+        self.listings[7].favoured.add(self.user)
+        response = self.client.get(reverse('index'), {'sort': 'popular'})
+        ids = [listing.id for listing in response.context['object_list']]
+        self.assertEqual(ids[:2], [self.listings[2].id, self.listings[7].id])
+        self.assertIn('sort=popular', response.context['pagination_query'])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.books = Category.objects.get(slug='books')
+
+    def listing(self, title, description='Test', **kwargs):
+        return Listing.objects.create(
+            title=title, description=description, starting_bid=1, current_price=1, user=self.seller, **kwargs
+        )
+
+    def results(self, query, **params):
+        response = self.client.get(reverse('search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [listing.id for listing in response.context['listings']]
+
+    def test_index_follows_save_and_delete(self):
+        bike = self.listing('Red bicycle')
+        self.assertEqual(self.results('bicycle'), [bike.id])
+        bike.title = 'Red tricycle'
+        bike.save()
+        self.assertEqual(self.results('bicycle'), [])
+        self.assertEqual(self.results('tricycle'), [bike.id])
+        bike.delete()
+        self.assertEqual(self.results('tricycle'), [])
+
+    def test_bids_do_not_reindex(self):
+        bike = self.listing('Red bicycle')
+        place_bid(bike.pk, self.seller, Decimal('5.00'))
+        self.assertEqual(self.results('bicycle'), [bike.id])
+
+    def test_title_matches_rank_first(self):
+        in_description = self.listing('Chair', 'goes well with a lamp')
+        in_title = self.listing('Lamp', 'brass')
+        self.assertEqual(self.results('lamp'), [in_title.id, in_description.id])
+
+    def test_stemming_and_prefix(self):
+        bikes = self.listing('Mountain bikes')
+        self.assertEqual(self.results('bike'), [bikes.id])
+        self.assertEqual(self.results('mount'), [bikes.id])
+
+    def test_filters(self):
+        active = self.listing('Old book', category=self.books)
+        closed = self.listing('Rare book', category=self.books, is_active=False)
+        other = self.listing('Book shelf')
+        self.assertEqual(set(self.results('book')), {active.id, other.id})
+        self.assertEqual(set(self.results('book', category='books')), {active.id})
+        self.assertEqual(set(self.results('book', include_closed='on')), {active.id, closed.id, other.id})
+
+    def test_fts_syntax_is_not_interpreted(self):
+        self.listing('Quote "test"')
+        self.assertEqual(len(self.results('"unbalanced OR NEAR(')), 0)
+        self.assertEqual(self.results('!!!'), [])
+
+    def test_cursor_pagination(self):
+        ids = {self.listing(f'Lamp {i}').id for i in range(20)}
+        response = self.client.get(reverse('search'), {'q': 'lamp'})
+        seen = [listing.id for listing in response.context['listings']]
+        while response.context['page_obj'].has_next():
+            response = self.client.get(reverse('search'), {'q': 'lamp', 'cursor': response.context['page_obj'].next_cursor})
+            seen += [listing.id for listing in response.context['listings']]
+        self.assertEqual(len(seen), 20)
+        self.assertEqual(set(seen), ids)
+
+    def test_rebuild_command(self):
+        lamp = self.listing('Lamp')
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO auctions_listing_fts(auctions_listing_fts) VALUES ('delete-all')")
+        self.assertEqual(self.results('lamp'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.results('lamp'), [lamp.id])
+
+    def test_admin_search_uses_index(self):
+        lamp = self.listing('Lamp')
+        self.listing('Chair')
+        admin_user = User.objects.create_superuser(username='admin', password='pass123')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:auctions_listing_changelist'), {'q': 'lamp'})
+        self.assertEqual([listing.id for listing in response.context['cl'].result_list], [lamp.id])
+
+    def test_missing_triggers_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER auctions_listing_fts_insert")
+        lamp = self.listing('Lamp')
+        ensure_search_index()
+        self.assertEqual(self.results('lamp'), [lamp.id])
+        chair = self.listing('Chair')
+        self.assertEqual(self.results('chair'), [chair.id])
+
+
+class AuctionExpiryTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.now = timezone.now()
+
+    def listing(self, ends_in, **kwargs):
+        return Listing.objects.create(
+            title='Item', description='Test', starting_bid=1, current_price=1, user=self.seller,
+            ends_at=self.now + ends_in if ends_in is not None else None, **kwargs
+        )
+
+    def test_bulk_close_assigns_winners(self):
+        won = self.listing(timedelta(minutes=1))
+        unsold = self.listing(timedelta(minutes=1))
+        running = self.listing(timedelta(hours=1))
+        forever = self.listing(None)
+        place_bid(won.pk, self.bidder, Decimal('5.00'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            closed = close_expired_auctions(self.now + timedelta(minutes=2))
+        self.assertEqual(sorted(closed), sorted([won.pk, unsold.pk]))
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+
+        won.refresh_from_db()
+        unsold.refresh_from_db()
+        self.assertFalse(won.is_active)
+        self.assertEqual(won.winner, self.bidder)
+        self.assertFalse(unsold.is_active)
+        self.assertIsNone(unsold.winner)
+        self.assertTrue(Listing.objects.get(pk=running.pk).is_active)
+        self.assertTrue(Listing.objects.get(pk=forever.pk).is_active)
+
+    def test_expired_listings_hidden_before_close(self):
+        expired = self.listing(timedelta(minutes=-1))
+        running = self.listing(timedelta(hours=1))
+        response = self.client.get(reverse('index'))
+        ids = [listing.id for listing in response.context['object_list']]
+        self.assertEqual(ids, [running.id])
+        self.assertNotIn(expired.id, ids)
+
+    def test_bid_after_deadline_rejected(self):
+        expired = self.listing(timedelta(minutes=-1))
+        with self.assertRaises(BidRejected):
+            place_bid(expired.pk, self.bidder, Decimal('5.00'))
+
+    def test_scheduler_wakes_for_next_deadline(self):
+        soon = self.listing(timedelta(seconds=30))
+        self.listing(timedelta(hours=5))
+        scheduler = ExpiryScheduler(horizon=timedelta(hours=1), refresh=timedelta(minutes=10))
+        self.assertEqual(scheduler.tick(self.now), [])
+        self.assertEqual(len(scheduler.deadlines), 1)
+        self.assertEqual(scheduler.next_wakeup(self.now), soon.ends_at)
+        self.assertEqual(scheduler.tick(self.now + timedelta(seconds=31)), [soon.pk])
+        self.assertEqual(scheduler.next_wakeup(self.now + timedelta(seconds=31)), self.now + timedelta(minutes=10))
+
+    def test_new_auction_with_duration(self):
+        self.client.login(username='seller', password='pass123')
+        self.client.post(reverse('new_auction'), {
+            'title': 'Timed', 'description': 'Test', 'starting_bid': 10, 'duration': 3,
+        })
+        listing = Listing.objects.get(title='Timed')
+        self.assertAlmostEqual(listing.ends_at, timezone.now() + timedelta(days=3), delta=timedelta(minutes=1))
+
+    def test_expire_command(self):
+        expired = self.listing(timedelta(minutes=-1))
+        out = StringIO()
+        call_command('expire_auctions', '--once', stdout=out)
+        self.assertIn('Closed 1', out.getvalue())
+        self.assertFalse(Listing.objects.get(pk=expired.pk).is_active)
+
+
+class LiveUpdateTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.auction = Listing.objects.create(
+            title='Item', description='Test', starting_bid=1, current_price=1, user=self.seller
+        )
+
+    async def test_hub_fans_out_per_listing(self):
+        events = EventHub()
+        first = events.subscribe(1)
+        second = events.subscribe(1)
+        other = events.subscribe(2)
+        published = events.publish(1, 'bid', {'price': Decimal('2.50')})
+
+        received = await first.get(timeout=1)
+        self.assertIs(received, published)
+        self.assertIs(await second.get(timeout=1), published)
+        self.assertEqual(json.loads(received.data), {'price': '2.50'})
+        self.assertIn(b'event: bid', received.sse)
+        with self.assertRaises(asyncio.TimeoutError):
+            await other.get(timeout=0.01)
+        self.assertIs(events.latest(1), published)
+
+        events.unsubscribe(1, first)
+        events.unsubscribe(1, second)
+        self.assertEqual(events.subscriber_count(1), 0)
+        self.assertEqual(events.subscriber_count(), 1)
+
+    async def test_slow_subscriber_keeps_latest_events(self):
+        events = EventHub(backlog=2)
+        subscriber = events.subscribe(1)
+        for price in range(5):
+            events.publish(1, 'bid', {'price': price})
+        await asyncio.sleep(0)
+        self.assertEqual([json.loads((await subscriber.get()).data)['price'] for _ in range(2)], [3, 4])
+
+    def test_bid_published_after_commit(self):
+        with mock.patch('auctions.bidding.publish_bid') as publish:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                place_bid(self.auction.pk, self.bidder, Decimal('5.00'))
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+        publish.assert_called_once_with(Bid.objects.get(auction=self.auction))
+
+    def test_expiry_publishes_closed(self):
+        Listing.objects.filter(pk=self.auction.pk).update(ends_at=timezone.now())
+        with mock.patch('auctions.expiry.publish_closed') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                close_expired_auctions()
+        publish.assert_called_once_with(self.auction.pk, None)
+
+    async def test_stream_sends_snapshot_then_events(self):
+        response = await AsyncClient().get(reverse('auction_events', args=[self.auction.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        stream = aiter(response.streaming_content)
+
+        snapshot = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn(b'event: snapshot', snapshot)
+        self.assertIn(b'"price": "1.00"', snapshot)
+        self.assertEqual(hub.subscriber_count(self.auction.pk), 1)
+
+        hub.publish(self.auction.pk, 'bid', {'price': '3.00', 'bidder': 'bidder'})
+        event = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn(b'event: bid', event)
+        self.assertIn(b'"price": "3.00"', event)
+
+    async def test_event_during_snapshot_read_is_delivered(self):
+        live_state = views._live_state
+
+        async def bid_lands_meanwhile(pk):
+            state = await live_state(pk)
+            hub.publish(pk, 'bid', {'price': '5.00', 'bidder': 'bidder'})
+            return state
+
+        with mock.patch('auctions.views._live_state', bid_lands_meanwhile):
+            response = await AsyncClient().get(reverse('auction_events', args=[self.auction.pk]))
+        stream = aiter(response.streaming_content)
+        snapshot = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn(b'"price": "1.00"', snapshot)
+        event = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn(b'"price": "5.00"', event)
+        # the snapshot does not claim the event it missed
+        self.assertNotIn(f'id: {hub.latest(self.auction.pk).id}\n'.encode(), snapshot)
+        await stream.aclose()
+
+    async def test_events_already_in_snapshot_are_skipped(self):
+        last_event_id = views.last_event_id
+
+        def bid_landed_before_read(pk):
+            hub.publish(pk, 'bid', {'price': '5.00', 'bidder': 'bidder'})
+            return last_event_id(pk)
+
+        with mock.patch('auctions.views.last_event_id', bid_landed_before_read):
+            response = await AsyncClient().get(reverse('auction_events', args=[self.auction.pk]))
+        stream = aiter(response.streaming_content)
+        await asyncio.wait_for(anext(stream), 1)
+        hub.publish(self.auction.pk, 'bid', {'price': '6.00', 'bidder': 'bidder'})
+        self.assertIn(b'"price": "6.00"', await asyncio.wait_for(anext(stream), 1))
+        await stream.aclose()
+
+    async def test_stream_for_missing_listing_leaves_no_subscriber(self):
+        missing = self.auction.pk + 100
+        response = await AsyncClient().get(reverse('auction_events', args=[missing]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(hub.subscriber_count(missing), 0)
+
+    def test_stream_refused_under_wsgi(self):
+        response = self.client.get(reverse('auction_events', args=[self.auction.pk]))
+        self.assertEqual(response.status_code, 204)
+
+    async def test_long_poll(self):
+        url = reverse('auction_poll', args=[self.auction.pk])
+        event = hub.publish(self.auction.pk, 'bid', {'price': '4.00', 'bidder': 'bidder'})
+        response = await AsyncClient().get(url, {'since': event.id - 1})
+        self.assertEqual(response.json(), {
+            'id': event.id, 'type': 'bid', 'data': {'price': '4.00', 'bidder': 'bidder'},
+        })
+
+        with mock.patch('auctions.views.LONG_POLL_TIMEOUT', 0.01):
+            response = await AsyncClient().get(url, {'since': event.id})
+            self.assertEqual(response.status_code, 204)
+            missing = await AsyncClient().get(reverse('auction_poll', args=[self.auction.pk + 100]))
+            self.assertEqual(missing.status_code, 404)
+        self.assertEqual(hub.subscriber_count(self.auction.pk), 0)
+
+    async def test_long_polls_wait_concurrently(self):
+        # the middleware stack stays async, so waiting polls do not queue
+        # behind each other on a sync thread
+        url = reverse('auction_poll', args=[self.auction.pk])
+        since = hub.publish(self.auction.pk, 'bid', {'price': '4.00', 'bidder': 'bidder'}).id
+        started = time.monotonic()
+        with mock.patch('auctions.views.LONG_POLL_TIMEOUT', 0.3):
+            responses = await asyncio.gather(*(AsyncClient().get(url, {'since': since}) for _ in range(10)))
+        self.assertEqual({response.status_code for response in responses}, {204})
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_page_carries_live_urls(self):
+        response = self.client.get(reverse('auction_view', args=[self.auction.pk]))
+        self.assertContains(response, reverse('auction_events', args=[self.auction.pk]))
+        self.assertContains(response, 'auctions/js/live.js')
+
+
+class ListingApiTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.category = Category.objects.create(name='Rare books', slug='rare-books')
+        self.auction = Listing.objects.create(
+            title='Item', description='Test', starting_bid=1, current_price=1,
+            user=self.seller, category=self.category,
+        )
+
+    def test_version_bumps_on_bid_edit_and_close(self):
+        self.assertEqual(self.auction.version, 0)
+        place_bid(self.auction.pk, self.bidder, Decimal('2.00'))
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.version, 1)
+        self.auction.title = 'Renamed'
+        self.auction.save(update_fields=['title'])
+        self.assertEqual(self.auction.version, 2)
+        Listing.objects.filter(pk=self.auction.pk).update(ends_at=timezone.now())
+        close_expired_auctions()
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.version, 3)
+
+    def test_listings(self):
+        Listing.objects.create(
+            title='Closed', description='Test', starting_bid=1, current_price=1,
+            user=self.seller, is_active=False,
+        )
+        response = self.client.get(reverse('api_listings'))
+        self.assertEqual(response.json()['results'], [{
+            'id': self.auction.pk, 'title': 'Item', 'image_url': None, 'current_price': '1.00',
+            'bid_count': 0, 'ends_at': None, 'category': 'rare-books',
+        }])
+        self.assertIsNone(response.json()['next'])
+
+    def test_listings_not_modified_until_a_bid(self):
+        url = reverse('api_listings')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        place_bid(self.auction.pk, self.bidder, Decimal('2.00'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['current_price'], '2.00')
+
+    def test_listings_cursor(self):
+        for i in range(25):
+            Listing.objects.create(title=f'More {i}', description='Test', starting_bid=1, current_price=1, user=self.seller)
+        first = self.client.get(reverse('api_listings')).json()
+        self.assertEqual(len(first['results']), 20)
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 6)
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_detail_with_top_bid(self):
+        url = reverse('api_listing', args=[self.auction.pk])
+        self.assertIsNone(self.client.get(url).json()['top_bid'])
+        place_bid(self.auction.pk, self.bidder, Decimal('3.00'))
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data['top_bid'], {'amount': '3.00', 'bidder': 'bidder'})
+        self.assertEqual(data['seller'], 'seller')
+        self.assertEqual(response['ETag'], f'"{self.auction.pk}-1"')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse('api_listing', args=[self.auction.pk + 100])).status_code, 404)
+
+    def test_bid_history(self):
+        for amount in ('2.00', '3.00', '4.00'):
+            place_bid(self.auction.pk, self.bidder, Decimal(amount))
+        url = reverse('api_listing_bids', args=[self.auction.pk])
+        response = self.client.get(url)
+        self.assertEqual([row['amount'] for row in response.json()['results']], ['4.00', '3.00', '2.00'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        place_bid(self.auction.pk, self.bidder, Decimal('5.00'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_read_only(self):
+        self.assertEqual(self.client.post(reverse('api_listings')).status_code, 405)
+
+
+@override_settings(AUCTIONS_PAGE_CACHE=False)
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        # ids come back after each test's rollback, cached fragments must not
+        cache.clear()
+        reset_fragment_stats()
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.listings = [
+            Listing.objects.create(
+                title=f'Item {i}', description='Test', starting_bid=1, current_price=1, user=self.seller
+            )
+            for i in range(3)
+        ]
+
+    def test_cards_hit_until_listing_changes(self):
+        self.client.get(reverse('index'))
+        self.assertEqual(fragment_stats()['index_card'], {'hits': 0, 'misses': 3})
+        self.client.get(reverse('index'))
+        self.assertEqual(fragment_stats()['index_card'], {'hits': 3, 'misses': 3})
+
+        place_bid(self.listings[0].pk, self.bidder, Decimal('5.00'))
+        self.client.get(reverse('index'))
+        self.assertEqual(fragment_stats()['index_card'], {'hits': 5, 'misses': 4})
+
+    def test_edit_shows_through(self):
+        url = reverse('auction_view', args=[self.listings[0].pk])
+        self.assertContains(self.client.get(url), 'Test')
+        listing = self.listings[0]
+        listing.description = 'Rewritten description'
+        listing.save()
+        self.assertContains(self.client.get(url), 'Rewritten description')
+        self.assertEqual(fragment_stats()['auction_description'], {'hits': 0, 'misses': 2})
+
+    def test_watched_marker_is_per_viewer(self):
+        self.listings[1].favoured.add(self.bidder)
+        self.client.get(reverse('index'))
+        self.client.login(username='bidder', password='pass123')
+        response = self.client.get(reverse('index'))
+        self.assertEqual(fragment_stats()['index_card'], {'hits': 3, 'misses': 3})
+        self.assertContains(response, 'card hoverable watched', count=1)
+
+    @override_settings(AUCTIONS_FRAGMENT_CACHE=False)
+    def test_disabled(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        self.assertEqual(fragment_stats(), {})
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.auction = Listing.objects.create(
+                title='Item', description='Test', starting_bid=1, current_price=1, user=self.seller
+            )
+        self.url = reverse('auction_view', args=[self.auction.pk])
+
+    def test_anonymous_hit_skips_the_database(self):
+        self.assertEqual(self.client.get(reverse('index'))['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Item')
+        self.assertIn('Cookie', response['Vary'])
+        self.assertEqual(self.client.get(reverse('index'), {'sort': 'popular'})['X-Page-Cache'], 'miss')
+
+    def test_logged_in_users_bypass(self):
+        self.client.get(self.url)
+        self.client.login(username='bidder', password='pass123')
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_bid_purges_listing_and_lists(self):
+        self.client.get(self.url)
+        self.client.get(reverse('index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            place_bid(self.auction.pk, self.bidder, Decimal('7.00'))
+        for url in (self.url, reverse('index')):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Page-Cache'], 'miss')
+            self.assertContains(response, '7.00')
+
+    def test_comment_purges_only_its_listing(self):
+        self.client.get(self.url)
+        self.client.get(reverse('index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(body='Nice one', user=self.bidder, auction=self.auction)
+        self.assertContains(self.client.get(self.url), 'Nice one')
+        self.assertEqual(self.client.get(reverse('index'))['X-Page-Cache'], 'hit')
+
+    def test_close_and_create_purge_lists(self):
+        self.client.get(reverse('index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.create(title='Fresh', description='Test', starting_bid=1, current_price=1, user=self.seller)
+        self.assertContains(self.client.get(reverse('index')), 'Fresh')
+
+        Listing.objects.filter(pk=self.auction.pk).update(ends_at=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            close_expired_auctions()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Auction Closed')
+
+    def test_pages_using_csrf_are_not_stored(self):
+        @cache_anonymous_page(lambda request: ['test'])
+        def view(request):
+            return HttpResponse(get_token(request))
+
+        factory = RequestFactory()
+        view(factory.get('/form/'))
+        self.assertFalse(view(factory.get('/form/')).has_header('X-Page-Cache'))
+
+
+@override_settings(AUCTIONS_PAGE_CACHE=False)
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.auction = Listing.objects.create(
+            title='Item', description='Test', starting_bid=1, current_price=1, user=self.seller
+        )
+        self.url = reverse('auction_view', args=[self.auction.pk])
+
+    def comment(self, n):
+        # a different author per comment, so lazy author lookups would show
+        start = Comment.objects.count()
+        return [
+            Comment.objects.create(
+                body=f'Comment {i}', auction=self.auction,
+                user=User.objects.create(username=f'author{i}', password='!'),
+            )
+            for i in range(start, start + n)
+        ]
+
+    def test_comment_count_follows_rows(self):
+        comments = self.comment(3)
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.comment_count, 3)
+        comments[0].delete()
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.comment_count, 2)
+
+    def test_render_is_constant_in_comments(self):
+        self.comment(3)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        self.comment(40)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(response.context['comments']), 20)
+        self.assertContains(response, 'Comments (43)')
+        self.assertFalse(any('COUNT(' in q['sql'] for q in many.captured_queries))
+
+    def test_load_more_walks_every_comment(self):
+        self.comment(45)
+        page = self.client.get(self.url).context['comments']
+        seen = [comment.body for comment in page]
+        while page.has_next():
+            response = self.client.get(reverse('auction_comments', args=[self.auction.pk]), {'cursor': page.next_cursor})
+            page = response.context['comments']
+            seen += [comment.body for comment in page]
+        self.assertEqual(seen, [f'Comment {i}' for i in reversed(range(45))])
+        self.assertNotContains(response, 'Load more')
+
+
+@override_settings(AUCTIONS_PAGE_CACHE=False)
+class MetricsTests(TestCase):
+    def setUp(self):
+        reset_metrics()
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        Listing.objects.create(title='Item', description='Test', starting_bid=1, current_price=1, user=self.seller)
+
+    def series(self, metric, view):
+        prefix = f'{metric}{{view="{view}"}} '
+        for line in render_prometheus().splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return None
+
+    def test_request_is_recorded_per_url_name(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('index'))
+        self.assertEqual(self.series('auctions_request_queries_sum', 'index'), len(ctx))
+        self.client.get(reverse('index'))
+        self.assertEqual(self.series('auctions_request_duration_seconds_count', 'index'), 2)
+        self.assertGreater(self.series('auctions_request_template_seconds_sum', 'index'), 0)
+        self.assertGreater(self.series('auctions_request_sql_seconds_sum', 'index'), 0)
+        self.assertIsNone(self.series('auctions_request_duration_seconds_count', 'watchlist'))
+
+    def test_buckets_are_cumulative(self):
+        for value in (0, 3, 3, 500):
+            observe('auctions_request_queries', 'test', value)
+        text = render_prometheus()
+        self.assertIn('auctions_request_queries_bucket{view="test",le="0"} 1', text)
+        self.assertIn('auctions_request_queries_bucket{view="test",le="2"} 1', text)
+        self.assertIn('auctions_request_queries_bucket{view="test",le="5"} 3', text)
+        self.assertIn('auctions_request_queries_bucket{view="test",le="200"} 3', text)
+        self.assertIn('auctions_request_queries_bucket{view="test",le="+Inf"} 4', text)
+        self.assertIn('auctions_request_queries_sum{view="test"} 506', text)
+
+    async def test_async_request_is_recorded(self):
+        async def view(request):
+            await Listing.objects.acount()
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(view_name='async_view')
+        response = await middleware(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.series('auctions_request_queries_sum', 'async_view'), 1)
+        self.assertEqual(self.series('auctions_request_duration_seconds_count', 'async_view'), 1)
+
+    @override_settings(AUCTIONS_QUERY_BUDGET=0)
+    def test_query_budget_alert(self):
+        with self.assertLogs('auctions.metrics', 'WARNING') as logs:
+            self.client.get(reverse('index'))
+        self.assertIn('index issued', logs.output[0])
+        self.assertIn('auctions_query_budget_exceeded_total{view="index"} 1', render_prometheus())
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertContains(response, '# TYPE auctions_request_duration_seconds histogram')
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 404)
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123', email='s@example.com')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.category = Category.objects.create(name='Rare Books', slug='rare-books')
+        self.listing = Listing.objects.create(
+            title='Item', description='Test', starting_bid=10, current_price=10,
+            user=self.seller, category=self.category,
+        )
+        self.bid = place_bid(self.listing.pk, self.bidder, Decimal('12.50'))
+
+    def export(self, *args):
+        out = StringIO()
+        call_command('export_auctions', *args, stdout=out)
+        return out.getvalue()
+
+    def test_jsonl_round_trip(self):
+        exported = self.export()
+        Listing.objects.all().delete()
+        User.objects.all().delete()
+        with mock.patch('sys.stdin', StringIO(exported)):
+            out = StringIO()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('import_auctions', '-', stdout=out)
+        self.assertIn('1 listing records, 1 bid records', out.getvalue())
+
+        listing = Listing.objects.get(title='Item')
+        self.assertEqual(listing.user.username, 'seller')
+        self.assertEqual(listing.user.email, 's@example.com')
+        self.assertFalse(listing.user.has_usable_password())
+        self.assertEqual(listing.category, self.category)
+        # the summary is recomputed and the original bid time is kept
+        self.assertEqual(listing.current_price, Decimal('12.50'))
+        self.assertEqual(listing.bid_count, 1)
+        self.assertEqual(listing.top_bidder.username, 'bidder')
+        self.assertEqual(listing.bids.get().timestamp, self.bid.timestamp)
+
+    def test_csv_export_and_import(self):
+        exported = self.export('--format', 'csv', '--type', 'listing')
+        self.assertTrue(exported.startswith('id,title,description'))
+        self.assertIn(f'{self.listing.pk},Item,Test,,10.00,rare-books,seller,True', exported)
+
+        path = self.tmp_file('listings.csv', exported)
+        call_command('import_auctions', path, '--type', 'listing', stdout=StringIO())
+        self.assertEqual(Listing.objects.filter(title='Item').count(), 2)
+
+    def test_csv_round_trip_one_type_per_file(self):
+        place_bid(self.listing.pk, self.seller, Decimal('14'))
+        files = {
+            record_type: self.tmp_file(f'{record_type}.csv', self.export('--format', 'csv', '--type', record_type))
+            for record_type in ('listing', 'bid')
+        }
+        original = self.listing.pk
+        Listing.objects.all().delete()
+
+        call_command('import_auctions', files['listing'], '--type', 'listing', '--keep-ids', stdout=StringIO())
+        # without the flag the ids could belong to unrelated local listings
+        with self.assertRaisesMessage(CommandError, f"unknown listing {original}"):
+            call_command('import_auctions', files['bid'], '--type', 'bid', stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_auctions', files['bid'], '--type', 'bid', '--keep-ids', stdout=StringIO())
+        listing = Listing.objects.get()
+        self.assertEqual(listing.pk, original)
+        self.assertEqual(listing.bid_count, 2)
+        self.assertEqual(listing.current_price, Decimal('14'))
+        self.assertEqual(listing.top_bidder, self.seller)
+        self.assertEqual(
+            list(listing.bids.order_by('id').values_list('user__username', 'amount')),
+            [('bidder', Decimal('12.50')), ('seller', Decimal('14'))],
+        )
+
+        # ids held by other listings are refused rather than renumbered
+        with self.assertRaisesMessage(CommandError, 'listing ids already in use'):
+            call_command('import_auctions', files['listing'], '--type', 'listing', '--keep-ids', stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, f"unknown listing {original + 1}"):
+            call_command('import_auctions', self.tmp_file('orphan.csv', (
+                f'listing,bidder,amount,timestamp\n{original + 1},bidder,20,\n'
+            )), '--type', 'bid', '--attach-existing', stdout=StringIO())
+
+    def test_bids_on_existing_listing_touch_only_it(self):
+        other = Listing.objects.create(title='Other', description='Test', starting_bid=1, current_price=1, user=self.seller)
+        path = self.tmp_file('bids.csv', f'listing,bidder,amount,timestamp\n{self.listing.pk},bidder,20,\n')
+        with mock.patch('auctions.transfer.purge_listings') as purge, self.captureOnCommitCallbacks(execute=True):
+            call_command('import_auctions', path, '--type', 'bid', '--attach-existing', stdout=StringIO())
+        purge.assert_called_once_with([self.listing.pk])
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.current_price, self.listing.bid_count), (Decimal('20'), 2))
+        self.assertEqual(Listing.objects.get(pk=other.pk).version, other.version)
+
+    def test_keep_ids_needs_ids(self):
+        path = self.tmp_file('listings.csv', 'id,title,starting_bid,seller\n,No id,1,seller\n')
+        with self.assertRaisesMessage(CommandError, 'listing without an id'):
+            call_command('import_auctions', path, '--type', 'listing', '--keep-ids', stdout=StringIO())
+
+    def test_failed_batch_rolls_back_alone(self):
+        path = self.tmp_file('bad.jsonl', '\n'.join([
+            json.dumps({'type': 'user', 'username': 'newcomer'}),
+            json.dumps({'type': 'listing', 'id': 1, 'title': 'X', 'starting_bid': '1', 'seller': 'newcomer'}),
+            json.dumps({'type': 'listing', 'id': 2, 'title': 'Y', 'starting_bid': '1', 'seller': 'nobody'}),
+            json.dumps({'type': 'bid', 'listing': 1, 'bidder': 'bidder', 'amount': '3'}),
+        ]))
+        with self.assertRaisesRegex(CommandError, "unknown user 'nobody'.*2 records before it imported"):
+            call_command('import_auctions', path, '--batch-size', '1', stdout=StringIO())
+        # one transaction per batch: the user and the first listing stay
+        self.assertTrue(User.objects.filter(username='newcomer').exists())
+        self.assertTrue(Listing.objects.filter(title='X').exists())
+        self.assertFalse(Listing.objects.filter(title='Y').exists())
+
+    def test_import_commits_per_batch(self):
+        path = self.tmp_file('users.jsonl', '\n'.join(
+            json.dumps({'type': 'user', 'username': f'user{n}'}) for n in range(5)
+        ))
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('import_auctions', path, '--batch-size', '2', stdout=StringIO())
+        # inside the test's transaction each batch's commit is a savepoint
+        self.assertEqual(sum(1 for q in ctx.captured_queries if q['sql'].startswith('SAVEPOINT')), 3)
+
+    def test_csv_needs_one_type(self):
+        with self.assertRaises(CommandError):
+            self.export('--format', 'csv')
+
+    def tmp_file(self, name, content):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='finance', password='pass123', is_staff=True)
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.listing = Listing.objects.create(
+            title='Item, large', description='Test', starting_bid=10, current_price=10, user=self.seller,
+        )
+        place_bid(self.listing.pk, self.bidder, Decimal('12'))
+        place_bid(self.listing.pk, self.seller, Decimal('15'))
+        Listing.objects.filter(pk=self.listing.pk).update(is_active=False, winner=self.seller)
+        Listing.objects.create(title='Open', description='Test', starting_bid=1, current_price=1, user=self.seller)
+        self.client.force_login(self.staff)
+
+    def rows(self, response):
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.reader(StringIO(content)))
+
+    def test_closed_auctions(self):
+        response = self.client.get(reverse('report_closed_auctions'))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="closed-auctions.csv"')
+        header, *rows = self.rows(response)
+        self.assertEqual(header[:3], ['id', 'title', 'seller'])
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][1], 'Item, large')
+        self.assertEqual(rows[0][5:8], ['15.00', '2', 'seller'])
+
+    def test_bid_history_in_placing_order(self):
+        header, *rows = self.rows(self.client.get(reverse('report_listing_bids', args=[self.listing.pk])))
+        self.assertEqual(header, ['bid_id', 'timestamp', 'bidder', 'amount'])
+        self.assertEqual([(row[2], row[3]) for row in rows], [('bidder', '12.00'), ('seller', '15.00')])
+        self.assertEqual(self.client.get(reverse('report_listing_bids', args=[999])).status_code, 404)
+
+    def test_user_activity(self):
+        _, *rows = self.rows(self.client.get(reverse('report_user_activity', args=['seller'])))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][3:], ['Item, large', '15.00', 'False', 'True'])
+        _, *rows = self.rows(self.client.get(reverse('report_user_activity', args=['bidder'])))
+        self.assertEqual(rows[0][-1], 'False')
+
+    async def test_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        with mock.patch('auctions.reports.ROWS_PER_WRITE', 1), warnings.catch_warnings():
+            # Django warns when it has to buffer a sync iterator
+            warnings.simplefilter('error')
+            response = await self.async_client.get(reverse('report_user_activity', args=['bidder']))
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        # the header, then a write per row, then the final drain
+        self.assertGreaterEqual(len(chunks), 3)
+        _, *rows = csv.reader(StringIO(b''.join(chunks).decode()))
+        self.assertEqual([row[4] for row in rows], ['12.00'])
+
+    def test_staff_only(self):
+        self.client.force_login(self.bidder)
+        response = self.client.get(reverse('report_closed_auctions'))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.streaming)
+
+
+class HighVolumeAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass123')
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.listings = [
+            Listing.objects.create(title=f'Item {i}', description='Test', starting_bid=1, current_price=1, user=self.admin)
+            for i in range(3)
+        ]
+        for i in range(60):
+            Bid.objects.create(amount=2 + i, user=self.bidder if i % 2 else self.admin, auction=self.listings[i % 3])
+        self.client.force_login(self.admin)
+
+    def test_changelists_render_in_constant_queries(self):
+        for name in ('listing', 'bid', 'comment'):
+            url = reverse(f'admin:auctions_{name}_changelist')
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # no exact COUNT(*) and no lookup per row
+            self.assertLess(len(ctx), 10, name)
+            self.assertFalse(any('COUNT(*)' in q['sql'] and 'LIMIT' not in q['sql'] for q in ctx.captured_queries))
+
+    def test_input_filters(self):
+        url = reverse('admin:auctions_bid_changelist')
+        response = self.client.get(url, {'listing': self.listings[0].pk, 'username': 'bidder'})
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertContains(response, 'name="listing" value="%d"' % self.listings[0].pk)
+        self.assertContains(response, '<input type="hidden" name="username" value="bidder">', html=True)
+        response = self.client.get(url, {'listing': 'abc'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_older_link_walks_by_id(self):
+        url = reverse('admin:auctions_bid_changelist')
+        response = self.client.get(url)
+        shown = [bid.pk for bid in response.context['cl'].result_list]
+        self.assertEqual(len(shown), 50)
+        older = response.context['cl'].older_url()
+        self.assertIn(f'before={shown[-1]}', older)
+        rest = self.client.get(url + older).context['cl'].result_list
+        self.assertEqual([bid.pk for bid in rest], sorted(Bid.objects.filter(pk__lt=shown[-1]).values_list('pk', flat=True), reverse=True))
+        self.assertIsNone(self.client.get(url + older).context['cl'].older_url())
+
+
+@override_settings(AUCTIONS_READ_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def handle(self, request, write=False):
+        # what the router decides for reads made by the view
+        seen = {}
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Bid)
+            seen['read'] = self.router.db_for_read(Listing)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen['read'], response
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Listing), 'default')
+        self.assertEqual(self.router.db_for_write(Listing), 'default')
+
+    def test_safe_request_reads_from_replica(self):
+        read, response = self.handle(self.factory.get('/'))
+        self.assertIn(read, ['replica1', 'replica2'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_request_and_sets_cookie(self):
+        read, response = self.handle(self.factory.post('/'), write=True)
+        self.assertEqual(read, 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.handle(request)[0], 'default')
+        request.COOKIES[PIN_COOKIE] = str(time.time() - 1)
+        self.assertIn(self.handle(request)[0], ['replica1', 'replica2'])
+
+    def test_write_during_get_pins_rest_of_request(self):
+        read, response = self.handle(self.factory.get('/'), write=True)
+        self.assertEqual(read, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(AUCTIONS_PAGE_CACHE=True)
+    def test_page_cache_fills_from_primary(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        reads = []
+
+        @cache_anonymous_page(lambda request: ['replica-test'])
+        def view(request):
+            reads.append(self.router.db_for_read(Listing))
+            return HttpResponse('page')
+
+        middleware = ReplicaRoutingMiddleware(view)
+        response = middleware(self.factory.get('/cached/'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(middleware(self.factory.get('/cached/'))['X-Page-Cache'], 'hit')
+        # pages that are not cached still read from a replica
+        request = self.factory.get('/cached/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = 'session'
+        middleware(request)
+        self.assertEqual(reads[0], 'default')
+        self.assertIn(reads[1], ['replica1', 'replica2'])
+
+    @override_settings(AUCTIONS_READ_REPLICAS=[])
+    def test_no_replicas(self):
+        read, response = self.handle(self.factory.post('/'), write=True)
+        self.assertEqual(read, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_copy_database(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        primary, replica = (os.path.join(directory.name, name) for name in ('primary.sqlite3', 'replica.sqlite3'))
+        with closing(sqlite3.connect(primary)) as db:
+            db.execute('CREATE TABLE bids (amount)')
+            db.execute('INSERT INTO bids VALUES (5)')
+            db.commit()
+        copy_database(primary, replica)
+        with closing(sqlite3.connect(replica)) as db:
+            self.assertEqual(db.execute('SELECT amount FROM bids').fetchall(), [(5,)])
+
+
+class SqliteProfileTests(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            pragmas = {
+                name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                for name in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout')
+            }
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['synchronous'], 1)
+        self.assertEqual(pragmas['mmap_size'], 256 * 1024 * 1024)
+        self.assertEqual(pragmas['cache_size'], -32000)
+        self.assertEqual(pragmas['busy_timeout'], 20000)
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    # the benchmarks seed a throwaway database of their own, here that is the
+    # test database (create_test_db would delete it), and their clients run on
+    # other threads, so the seeded rows have to be committed
+    def setUp(self):
+        for name, value in (('create_test_db', connection.settings_dict['NAME']), ('destroy_test_db', None)):
+            patcher = mock.patch.object(connection.creation, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def bench_views_args(self, *args):
+        return [
+            '--users', '5', '--listings', '10', '--bids-per-listing', '2', '--comments-per-listing', '1',
+            '--watched-per-user', '2', '--clients', '2', '--requests', '3',
+            '--output', os.path.join(self.tmp.name, 'results.json'), *args,
+        ]
+
+    def write_baseline(self, p95_ms):
+        path = os.path.join(self.tmp.name, 'baseline.json')
+        with open(path, 'w') as f:
+            json.dump({'scenarios': {name: {'p95_ms': p95_ms} for name in bench_views.SCENARIOS}}, f)
+        return path
+
+    def test_summary_percentiles(self):
+        summary = bench_views._summary([i / 1000 for i in range(100, 0, -1)], 2, 4)
+        self.assertEqual(summary['requests'], 100)
+        self.assertEqual(summary['errors'], 2)
+        self.assertEqual(summary['throughput_rps'], 25.0)
+        self.assertEqual(summary['p50_ms'], 50.5)
+        self.assertEqual(summary['p95_ms'], 95.05)
+        self.assertEqual(summary['max_ms'], 100)
+        # a single sample is every percentile
+        single = bench_views._summary([0.25], 0, 1)
+        self.assertEqual((single['p50_ms'], single['p99_ms'], single['max_ms']), (250, 250, 250))
+
+    def test_bench_views_writes_results_within_baseline(self):
+        out = StringIO()
+        call_command('bench_views', *self.bench_views_args('--baseline', self.write_baseline(10 ** 6)), stdout=out)
+        with open(os.path.join(self.tmp.name, 'results.json')) as f:
+            results = json.load(f)
+        self.assertEqual(set(results['scenarios']), set(bench_views.SCENARIOS))
+        for name, summary in results['scenarios'].items():
+            with self.subTest(name):
+                self.assertEqual(summary['requests'], 6)
+                self.assertEqual(summary['errors'], 0)
+        self.assertEqual(results['dataset']['listings'], 10)
+        self.assertIn('p95 1000000.00 ->', out.getvalue())
+
+    def test_bench_views_exits_non_zero_on_regression(self):
+        # every real request is slower than a microsecond
+        args = self.bench_views_args('--scenario', 'index', '--baseline', self.write_baseline(0.001))
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('sys.stdout', stdout), mock.patch('sys.stderr', stderr):
+            with self.assertRaises(SystemExit) as ctx:
+                bench_views.Command().run_from_argv(['manage.py', 'bench_views', *args])
+        self.assertEqual(ctx.exception.code, 1)
+        self.assertIn('p95 regressed by more than 20%: index', stderr.getvalue())
+
+    def test_bench_fragments(self):
+        out = StringIO()
+        call_command('bench_fragments', '--listings', '5', '--requests', '4', stdout=out)
+        self.assertRegex(out.getvalue(), r'index: [\d.]+ ms uncached, [\d.]+ ms cached')
+        self.assertRegex(out.getvalue(), r'auction_view: [\d.]+ ms uncached')
+        self.assertRegex(out.getvalue(), r'card: \d+ hits, \d+ misses')
+
+    def test_bench_live_updates(self):
+        out = StringIO()
+        call_command('bench_live_updates', '--connections', '3', stdout=out)
+        self.assertIn('connections:          3', out.getvalue())
+        self.assertEqual(hub.subscriber_count(Listing.objects.get().pk), 0)
+
+    def test_check_query_plans(self):
+        out = StringIO()
+        call_command('check_query_plans', '--users', '5', '--listings', '50', '--bids-per-listing', '2', stdout=out)
+        for name, queryset in hot_queries():
+            self.assertIn(f'{name}: ok', out.getvalue())
+
+
+class BidArchiveTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='finance', password='pass123', is_staff=True)
+        self.bidder = User.objects.create_user(username='bidder', password='pass123')
+        self.closed = [
+            Listing.objects.create(title=f'Closed {i}', description='Test', starting_bid=1, current_price=1, user=self.staff)
+            for i in range(3)
+        ]
+        self.open = Listing.objects.create(title='Open', description='Test', starting_bid=1, current_price=1, user=self.staff)
+        for listing in [*self.closed, self.open]:
+            for amount in (2, 3, 4):
+                place_bid(listing.pk, self.bidder, Decimal(amount))
+        Listing.objects.filter(pk__in=[listing.pk for listing in self.closed]).update(is_active=False)
+
+    def test_moves_closed_listings_in_whole_listing_chunks(self):
+        before = list(Bid.objects.filter(auction__in=self.closed).order_by('id').values_list('id', 'amount', 'timestamp', 'auction_id'))
+        with CaptureQueriesContext(connection) as ctx:
+            moved, listings = archive_closed_bids(batch_size=4)
+        self.assertEqual((moved, listings), (9, 3))
+        # one listing per transaction, since two would be over the batch size
+        self.assertEqual(sum(1 for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO')), 3)
+        self.assertFalse(Bid.objects.filter(auction__in=self.closed).exists())
+        self.assertEqual(Bid.objects.filter(auction=self.open).count(), 3)
+        self.assertEqual(
+            list(ArchivedBid.objects.order_by('id').values_list('id', 'amount', 'timestamp', 'auction_id')), before,
+        )
+        self.assertEqual(Listing.objects.filter(bids_archived=True).count(), 3)
+        # the summary stays, and a second run has nothing to do
+        self.assertEqual(Listing.objects.get(pk=self.closed[0].pk).bid_count, 3)
+        self.assertEqual(archive_closed_bids(), (0, 0))
+
+    def test_history_reads_from_archive(self):
+        pk = self.closed[0].pk
+        api_before = self.client.get(reverse('api_listing_bids', args=[pk])).json()['results']
+        self.client.force_login(self.staff)
+        report_before = b''.join(self.client.get(reverse('report_listing_bids', args=[pk])).streaming_content)
+        call_command('archive_bids', '--pause', '0', stdout=StringIO())
+
+        self.assertEqual(self.client.get(reverse('api_listing_bids', args=[pk])).json()['results'], api_before)
+        self.assertEqual(b''.join(self.client.get(reverse('report_listing_bids', args=[pk])).streaming_content), report_before)
+        activity = b''.join(self.client.get(reverse('report_user_activity', args=['bidder'])).streaming_content)
+        ids = [int(line.split(',')[0]) for line in activity.decode().splitlines()[1:]]
+        self.assertEqual(len(ids), 12)
+        self.assertEqual(ids, sorted(ids))
+
+    def test_large_listing_moves_in_id_ranges(self):
+        listing = self.open
+        for amount in range(5, 12):
+            place_bid(listing.pk, self.bidder, Decimal(amount))
+        Listing.objects.filter(pk=listing.pk).update(is_active=False)
+        url = reverse('api_listing_bids', args=[listing.pk])
+        expected = self.client.get(url).json()['results']
+        self.client.force_login(self.staff)
+        report = b''.join(self.client.get(reverse('report_listing_bids', args=[listing.pk])).streaming_content)
+        seen = []
+
+        def between_chunks(seconds):
+            # half moved: readers still get the whole history
+            if ArchivedBid.objects.filter(auction=listing).exists() and not Listing.objects.get(pk=listing.pk).bids_archived:
+                seen.append(Bid.objects.filter(auction=listing).count())
+                self.assertEqual(self.client.get(url).json()['results'], expected)
+                self.assertEqual(b''.join(self.client.get(reverse('report_listing_bids', args=[listing.pk])).streaming_content), report)
+
+        with mock.patch('auctions.archive.time.sleep', side_effect=between_chunks):
+            self.assertEqual(archive_closed_bids(batch_size=4, pause=0.01), (19, 4))
+        self.assertEqual(seen, [6, 2])
+        self.assertTrue(Listing.objects.get(pk=listing.pk).bids_archived)
+        self.assertEqual(ArchivedBid.objects.filter(auction=listing).count(), 10)
+        self.assertEqual(self.client.get(url).json()['results'], expected)
+
+    def test_merged_pages_keep_rows_once(self):
+        bids = Bid.objects.filter(auction=self.open).values('id', 'amount')
+        paginator = MergedCursorPaginator([bids, bids], 2, ordering=('-amount', '-id'))
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual([row['amount'] for row in [*first, *second]], [4, 3, 2])
+        self.assertIsNone(second.next_cursor)
+
+    def test_export_includes_archived_bids(self):
+        archive_closed_bids()
+        out = StringIO()
+        call_command('export_auctions', '--type', 'bid', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 12)
+
+
+def _jpeg_upload(name='photo.jpg', size=(1600, 900)):
+    out = BytesIO()
+    Image.new('RGB', size, (200, 80, 20)).save(out, 'JPEG')
+    return SimpleUploadedFile(name, out.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(AUCTIONS_IMAGE_WORKERS=0, AUCTIONS_PAGE_CACHE=False)
+class ListingImageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.user = User.objects.create_user(username='seller', password='pass123')
+        self.client.force_login(self.user)
+
+    def create(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('new_auction'), {
+                'title': 'Lamp', 'description': 'Brass', 'starting_bid': '5', **data,
+            })
+        self.assertEqual(response.status_code, 302)
+        return Listing.objects.get(title='Lamp')
+
+    def test_upload_makes_thumbnail_and_detail(self):
+        listing = self.create(image=_jpeg_upload())
+        self.assertEqual((listing.thumbnail_width, listing.thumbnail_height), (480, 320))
+        self.assertEqual((listing.detail_width, listing.detail_height), (1200, 675))
+        with Image.open(listing.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (480, 320))
+        self.assertLess(listing.thumbnail.size, listing.image.size)
+
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, f'src="{listing.thumbnail.url}" width="480" height="320"')
+        response = self.client.get(reverse('auction_view', args=[listing.pk]))
+        self.assertContains(response, f'src="{listing.detail.url}" width="1200" height="675"')
+
+    def test_rejects_non_images(self):
+        response = self.client.post(reverse('new_auction'), {
+            'title': 'Lamp', 'description': 'Brass', 'starting_bid': '5',
+            'image': SimpleUploadedFile('notes.jpg', b'not an image', content_type='image/jpeg'),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Listing.objects.exists())
+
+    @override_settings(AUCTIONS_SERVE_MEDIA=True)
+    def test_renditions_are_cached_forever(self):
+        listing = self.create(image=_jpeg_upload())
+        response = self.client.get(listing.thumbnail.url)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertNotIn('Cache-Control', self.client.get(listing.image.url))
+
+    def test_backfill_from_local_files(self):
+        Listing.objects.create(
+            title='Old', description='Hotlinked', starting_bid=1, current_price=1, user=self.user,
+            image_url='https://images.example.com/stock/old-lamp.jpg?w=2000',
+        )
+        source = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        with open(os.path.join(source.name, 'old-lamp.jpg'), 'wb') as f:
+            f.write(_jpeg_upload(size=(300, 300)).read())
+        out = StringIO()
+        call_command('backfill_images', '--source-dir', source.name, stdout=out)
+        self.assertIn('Took 1 originals', out.getvalue())
+        self.assertIn('Made renditions for 1 listings, 0 failed', out.getvalue())
+        listing = Listing.objects.get(title='Old')
+        self.assertEqual((listing.detail_width, listing.detail_height), (300, 300))
+        self.assertEqual((listing.thumbnail_width, listing.thumbnail_height), (480, 320))
+
+
+class ImageWorkerPoolTests(TransactionTestCase):
+    @override_settings(AUCTIONS_IMAGE_WORKERS=1)
+    def test_renditions_made_in_worker_process(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        user = User.objects.create_user(username='seller', password='pass123')
+        with override_settings(MEDIA_ROOT=media.name):
+            listing = Listing(title='Lamp', description='Brass', starting_bid=5, current_price=5, user=user)
+            listing.image.save('photo.jpg', _jpeg_upload(), save=True)
+            future = submit_renditions(listing.pk)
+            future.result(timeout=60)
+            # the result is saved by a callback on the pool's thread
+            for _ in range(100):
+                listing.refresh_from_db()
+                if listing.thumbnail:
+                    break
+                time.sleep(0.05)
+        self.assertEqual(listing.thumbnail_width, 480)
+
+
+class ProxyBidTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='pass123')
+        self.alice = User.objects.create_user(username='alice', password='pass123')
+        self.bob = User.objects.create_user(username='bob', password='pass123')
+        self.carol = User.objects.create_user(username='carol', password='pass123')
+        self.listing = Listing.objects.create(
+            title='Item', description='Test', starting_bid=10, current_price=10, user=self.seller,
+        )
+
+    def state(self):
+        listing = Listing.objects.get(pk=self.listing.pk)
+        return listing.current_price, listing.top_bidder, listing.bid_count
+
+    def test_first_ceiling_bids_the_minimum(self):
+        bid = set_proxy_bid(self.listing.pk, self.alice, Decimal('50'))
+        self.assertEqual(bid.amount, Decimal('10.01'))
+        self.assertEqual(self.state(), (Decimal('10.01'), self.alice, 1))
+
+    def test_competing_ceilings_settle_in_one_bid(self):
+        set_proxy_bid(self.listing.pk, self.alice, Decimal('50'))
+        set_proxy_bid(self.listing.pk, self.bob, Decimal('30'))
+        # alice stays on top at bob's ceiling plus one increment
+        self.assertEqual(self.state(), (Decimal('30.01'), self.alice, 2))
+        set_proxy_bid(self.listing.pk, self.carol, Decimal('80'))
+        self.assertEqual(self.state(), (Decimal('50.01'), self.carol, 3))
+        self.assertEqual(Bid.objects.filter(auction=self.listing).count(), 3)
+
+    def test_capped_at_the_leading_ceiling_and_ties_go_to_the_earlier(self):
+        set_proxy_bid(self.listing.pk, self.alice, Decimal('40'))
+        set_proxy_bid(self.listing.pk, self.bob, Decimal('40'))
+        self.assertEqual(self.state(), (Decimal('40.00'), self.alice, 2))
+        set_proxy_bid(self.listing.pk, self.bob, Decimal('41'))
+        self.assertEqual(self.state()[:2], (Decimal('40.01'), self.bob))
+
+    def test_raising_own_ceiling_does_not_bid(self):
+        set_proxy_bid(self.listing.pk, self.alice, Decimal('20'))
+        self.assertIsNone(set_proxy_bid(self.listing.pk, self.alice, Decimal('60')))
+        self.assertEqual(self.state(), (Decimal('10.01'), self.alice, 1))
+        with self.assertRaisesMessage(BidRejected, 'your maximum is already $60.00'):
+            set_proxy_bid(self.listing.pk, self.alice, Decimal('55'))
+
+    def test_ordinary_bid_is_answered_by_ceiling(self):
+        set_proxy_bid(self.listing.pk, self.alice, Decimal('50'))
+        place_bid(self.listing.pk, self.bob, Decimal('25'))
+        self.assertEqual(self.state(), (Decimal('25.01'), self.alice, 3))
+        # past the ceiling, the ordinary bid stands
+        place_bid(self.listing.pk, self.bob, Decimal('70'))
+        self.assertEqual(self.state(), (Decimal('70.00'), self.bob, 4))
+
+    def test_ceiling_must_clear_current_price(self):
+        place_bid(self.listing.pk, self.bob, Decimal('25'))
+        with self.assertRaises(BidRejected):
+            set_proxy_bid(self.listing.pk, self.alice, Decimal('25'))
+        form = ProxyBidForm(data={'max_amount': '25'}, auction=Listing.objects.get(pk=self.listing.pk))
+        self.assertIn('you must bid higher than $25.00', form.errors['max_amount'][0])
+
+    @override_settings(AUCTIONS_PAGE_CACHE=False)
+    def test_set_maximum_from_auction_page(self):
+        self.client.force_login(self.alice)
+        url = reverse('auction_view', args=[self.listing.pk])
+        response = self.client.post(url, {'proxy': '', 'max_amount': '45'})
+        self.assertRedirects(response, url)
+        self.assertEqual(self.state()[:2], (Decimal('10.01'), self.alice))
+        self.assertContains(self.client.get(url), 'We bid for you up to $45.00')
+        # nobody else sees it
+        self.client.force_login(self.bob)
+        self.assertNotContains(self.client.get(url), '45.00')
@@ -0,0 +1,275 @@
+import csv
+import datetime
+import json
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .bidding import recompute_bid_summary
+from .categories import invalidate_categories
+from .models import User, Category, Listing, Bid, ArchivedBid
+from .page_cache import purge_listings
+from .seed import insert_rows
+
+
+# dependency order: a record may only refer to records of earlier types.
+# users and categories are matched by natural key (username, slug);
+# listings by the id they had in the source, which bids refer to. only
+# with keep_ids or attach_existing does a bid whose listing was not
+# imported in the same run attach to the existing listing with that id,
+# which is how a bid CSV finds the listings of an earlier keep_ids run
+FIELDS = {
+    "user": ["username", "email", "first_name", "last_name", "date_joined"],
+    "category": ["slug", "name"],
+    "listing": [
+        "id", "title", "description", "image_url", "starting_bid", "category",
+        "seller", "is_active", "ends_at", "winner",
+    ],
+    "bid": ["listing", "bidder", "amount", "timestamp"],
+}
+RECORD_TYPES = tuple(FIELDS)
+
+# ids per IN (...) lookup, under SQLite's bound-parameter limit
+LOOKUP_SIZE = 900
+
+EXPORT_QUERIES = {
+    "user": lambda: [User.objects.values_list("username", "email", "first_name", "last_name", "date_joined")],
+    "category": lambda: [Category.objects.values_list("slug", "name")],
+    "listing": lambda: [Listing.objects.values_list(
+        "id", "title", "description", "image_url", "starting_bid", "category__slug",
+        "user__username", "is_active", "ends_at", "winner__username",
+    )],
+    # archived bids come back into Bid on import, until archive_bids runs there
+    "bid": lambda: [
+        model.objects.values_list("auction_id", "user__username", "amount", "timestamp")
+        for model in (ArchivedBid, Bid)
+    ],
+}
+
+
+class ImportFailed(Exception):
+    pass
+
+
+class TransferEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts datetimes to milliseconds, which would reorder
+    # bids placed within the same millisecond
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_records(types=RECORD_TYPES, chunk_size=2000):
+    # server-side chunks in id order, so memory stays flat at any size
+    for record_type in types:
+        fields = FIELDS[record_type]
+        for queryset in EXPORT_QUERIES[record_type]():
+            for row in queryset.order_by("id").iterator(chunk_size=chunk_size):
+                yield record_type, dict(zip(fields, row))
+
+
+def write_jsonl(records, out):
+    for record_type, record in records:
+        out.write(json.dumps({"type": record_type, **record}, cls=TransferEncoder) + "\n")
+
+
+def write_csv(records, out, record_type):
+    writer = csv.writer(out)
+    writer.writerow(FIELDS[record_type])
+    for _, record in records:
+        writer.writerow([_csv_value(record[field]) for field in FIELDS[record_type]])
+
+
+def read_jsonl(lines):
+    for line in lines:
+        if line.strip():
+            record = json.loads(line)
+            yield record.pop("type", None), record
+
+
+def read_csv(lines, record_type):
+    for row in csv.DictReader(lines):
+        yield record_type, {field: value if value != "" else None for field, value in row.items()}
+
+
+class Importer:
+    # buffers consecutive records of one type and writes them with one
+    # bulk insert per batch, each batch in its own transaction so the write
+    # lock is only held briefly and live bids get in between. the caller
+    # calls finish() once everything has been added, or settle() after a
+    # failed batch to bring the committed ones up to date
+    def __init__(self, batch_size=5000, keep_ids=False, attach_existing=False):
+        self.batch_size = batch_size
+        self.keep_ids = keep_ids
+        # source listing ids are local ids, so bids may refer to listings
+        # this run did not import
+        self.attach_existing = keep_ids or attach_existing
+        self.users = dict(User.objects.values_list("username", "id"))
+        self.categories = dict(Category.objects.values_list("slug", "id"))
+        self.listings = {}
+        # local ids of the listings imported and of the existing ones that
+        # got bids: their summaries and cached pages are redone at the end
+        self.touched = set()
+        self.counts = Counter()
+        self.committed = 0
+        self.pending_type = None
+        self.pending = []
+
+    def add(self, record_type, record):
+        if record_type not in FIELDS:
+            raise ImportFailed(f"unknown record type {record_type!r}")
+        if record_type != self.pending_type or len(self.pending) >= self.batch_size:
+            self.flush()
+            self.pending_type = record_type
+        self.pending.append(record)
+
+    def flush(self):
+        if self.pending:
+            with transaction.atomic():
+                getattr(self, f"load_{self.pending_type}")(self.pending)
+            self.counts[self.pending_type] += len(self.pending)
+            self.committed += len(self.pending)
+            self.pending = []
+
+    def finish(self):
+        self.flush()
+        self.settle()
+        return self.counts
+
+    def settle(self):
+        # summaries are rebuilt from the Bid rows rather than adjusted, so
+        # this is safe to run again over listings it has already done
+        touched = sorted(self.touched)
+        for start in range(0, len(touched), LOOKUP_SIZE):
+            chunk = touched[start:start + LOOKUP_SIZE]
+            with transaction.atomic():
+                # one pass over the listings instead of a price update per bid
+                recompute_bid_summary(Listing.objects.filter(pk__in=chunk))
+                # bulk inserts skip the signals, so drop the cached pages here
+                purge_listings(chunk)
+        if self.counts["category"]:
+            transaction.on_commit(invalidate_categories)
+            # the list pages carry the category menu
+            purge_listings(())
+
+    def load_user(self, records):
+        new = {}
+        for record in records:
+            username = record["username"]
+            if username not in self.users:
+                # passwords are not carried over, imported users reset theirs
+                new[username] = User(
+                    username=username,
+                    email=record.get("email") or "",
+                    first_name=record.get("first_name") or "",
+                    last_name=record.get("last_name") or "",
+                    date_joined=_datetime(record.get("date_joined")) or timezone.now(),
+                    password=make_password(None),
+                )
+        User.objects.bulk_create(new.values(), ignore_conflicts=True)
+        self.users.update(User.objects.filter(username__in=new).values_list("username", "id"))
+
+    def load_category(self, records):
+        new = {
+            record["slug"]: Category(slug=record["slug"], name=record["name"])
+            for record in records if record["slug"] not in self.categories
+        }
+        Category.objects.bulk_create(new.values(), ignore_conflicts=True)
+        self.categories.update(Category.objects.filter(slug__in=new).values_list("slug", "id"))
+
+    def load_listing(self, records):
+        listings = []
+        for record in records:
+            starting_bid = Decimal(record["starting_bid"])
+            if self.keep_ids and record.get("id") is None:
+                raise ImportFailed("listing without an id, which keep_ids needs")
+            listings.append(Listing(
+                id=int(record["id"]) if self.keep_ids else None,
+                title=record["title"],
+                description=record.get("description") or "",
+                image_url=record.get("image_url"),
+                starting_bid=starting_bid,
+                current_price=starting_bid,
+                category_id=self._resolve(self.categories, "category", record.get("category"), optional=True),
+                user_id=self._resolve(self.users, "user", record["seller"]),
+                is_active=_bool(record.get("is_active"), default=True),
+                ends_at=_datetime(record.get("ends_at")),
+                winner_id=self._resolve(self.users, "user", record.get("winner"), optional=True),
+            ))
+        try:
+            Listing.objects.bulk_create(listings)
+        except IntegrityError:
+            raise ImportFailed("listing ids already in use, import without keep_ids") from None
+        self.touched.update(listing.pk for listing in listings)
+        for record, listing in zip(records, listings):
+            if record.get("id") is not None:
+                self.listings[int(record["id"])] = listing.pk
+
+    def load_bid(self, records):
+        # a raw insert rather than bulk_create, which would replace every
+        # timestamp with now() through auto_now_add
+        now = timezone.now()
+        if self.attach_existing:
+            self._find_existing_listings({int(record["listing"]) for record in records} - self.listings.keys())
+        insert_rows(Bid, ["amount", "timestamp", "user_id", "auction_id"], [
+            (
+                str(Decimal(record["amount"])),
+                connection.ops.adapt_datetimefield_value(_datetime(record.get("timestamp")) or now),
+                self._resolve(self.users, "user", record["bidder"]),
+                self._resolve(self.listings, "listing", int(record["listing"])),
+            )
+            for record in records
+        ])
+
+    def _find_existing_listings(self, ids):
+        ids = sorted(ids)
+        for start in range(0, len(ids), LOOKUP_SIZE):
+            for pk, bids_archived in Listing.objects.filter(pk__in=ids[start:start + LOOKUP_SIZE]).values_list(
+                "pk", "bids_archived"
+            ):
+                if bids_archived:
+                    # new rows in Bid would not show next to the archived ones
+                    raise ImportFailed(f"listing {pk} has archived bids")
+                self.listings[pk] = pk
+                self.touched.add(pk)
+
+    def _resolve(self, known, kind, key, optional=False):
+        if key is None and optional:
+            return None
+        try:
+            return known[key]
+        except KeyError:
+            raise ImportFailed(f"unknown {kind} {key!r}") from None
+
+
+def _bool(value, default):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return value.strip().lower() in ("1", "true", "yes")
+
+
+def _datetime(value):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ImportFailed(f"invalid datetime {value!r}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
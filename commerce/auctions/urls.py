@@ -1,4 +1,7 @@
+from django.conf import settings
 from django.urls import path
+import auctions.api as api
+import auctions.reports as reports
 import auctions.views as views
 
 urlpatterns = [
@@ -10,7 +13,21 @@ urlpatterns = [
     path("auction/<int:pk>/", views.auction_view, name='auction_view'),
     path("auction/<int:pk>/watchlist/", views.add_to_watchlist, name='add_to_watchlist'),
     path("auction/<int:pk>/end/", views.end_auction, name="end_auction"),
+    path("auction/<int:pk>/comments/", views.auction_comments, name="auction_comments"),
+    path("auction/<int:pk>/events/", views.auction_events, name="auction_events"),
+    path("auction/<int:pk>/poll/", views.auction_poll, name="auction_poll"),
     path("watchlist/", views.watchlist, name="watchlist"),
     path("categories/", views.CategoriesView.as_view(), name="categories"),
     path("categories/<slug:slug>/", views.CategoryListings.as_view(), name="category_listings"),
+    path("search/", views.search, name="search"),
+    path("metrics", views.metrics, name="metrics"),
+    path("api/listings/", api.listings, name="api_listings"),
+    path("api/listings/<int:pk>/", api.listing_detail, name="api_listing"),
+    path("api/listings/<int:pk>/bids/", api.listing_bids, name="api_listing_bids"),
+    path("reports/closed-auctions.csv", reports.closed_auctions, name="report_closed_auctions"),
+    path("reports/listings/<int:pk>/bids.csv", reports.listing_bid_history, name="report_listing_bids"),
+    path("reports/users/<str:username>/activity.csv", reports.user_activity, name="report_user_activity"),
 ]
+
+if settings.AUCTIONS_SERVE_MEDIA:
+    urlpatterns.append(path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", views.media, name="media"))
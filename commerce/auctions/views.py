@@ -1,28 +1,65 @@
-from decimal import Decimal
+import asyncio
+import json
+from functools import partial
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError
-from django.http import HttpResponseRedirect
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views.generic import ListView
+from django.views.static import serve
 
-from .forms import NewAuctionForm, BidForm, CommentForm
-from .models import User, Listing, Category
+from .bidding import BidRejected, minimum_bid, set_proxy_bid, submit_bid
+from .comments import comments_page
+from .metrics import render_prometheus
+from .events import hub, last_event_id, publish_closed, snapshot_event
+from .forms import NewAuctionForm, BidForm, ProxyBidForm, CommentForm, SearchForm
+from .images import RENDITIONS_DIR, schedule_renditions
+from .models import User, Listing, Category, ProxyBid
+from .page_cache import LISTS_TAG, cache_anonymous_page, listing_tag, purge_listing
+from .pagination import CursorPaginationMixin, CursorPaginator
+from .search import search_listings
+from .watchlist import is_watching, toggle_watch, watched_ids, watchlist_for
 
 
-class IndexListView(ListView):
+SSE_HEARTBEAT = 15
+LONG_POLL_TIMEOUT = 25
+
+
+def _list_tags(request, *args, **kwargs):
+    return [LISTS_TAG]
+
+
+@method_decorator(cache_anonymous_page(_list_tags), name="dispatch")
+class IndexListView(CursorPaginationMixin, ListView):
     model = Listing
     template_name = "auctions/index.html"
     paginate_by = 9
+    sort_orderings = {
+        "newest": ["-id"],
+        "popular": ["-watcher_count", "-id"],
+    }
 
     def get_queryset(self):
-        return Listing.objects.filter(is_active=True).order_by("-id")
+        return Listing.objects.open()
+
+    def get_ordering(self):
+        self.sort = self.request.GET.get("sort")
+        if self.sort not in self.sort_orderings:
+            self.sort = "newest"
+        return self.sort_orderings[self.sort]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context["sort"] = self.sort
+        context["watched_ids"] = watched_ids(self.request.user, [l.id for l in context["object_list"]])
         return context
 
 
@@ -77,50 +114,64 @@ def register(request):
         return render(request, "auctions/register.html")
 
 
-class CategoryListings(ListView):
+@method_decorator(cache_anonymous_page(_list_tags), name="dispatch")
+class CategoryListings(CursorPaginationMixin, ListView):
     template_name = "auctions/category_listings.html"
-    muodel = Listing
+    model = Listing
     context_object_name = 'listings'
+    paginate_by = 9
 
     def get_queryset(self):
         category_slug = self.kwargs['slug']
-        category = get_object_or_404(Category, slug=category_slug)
-        return Listing.objects.filter(category=category, is_active=True)
+        self.category = get_object_or_404(Category, slug=category_slug)
+        return Listing.objects.open().filter(category=self.category)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["category"] = self.category
+        context["watched_ids"] = watched_ids(self.request.user, [l.id for l in context["object_list"]])
+        return context
 
 
 @login_required
 def watchlist(request):
-    watched_items = request.user.favoured.all()
-    return render(request, "auctions/watchlist.html", {"listings": watched_items})
+    page = CursorPaginator(watchlist_for(request.user), 12).page(request.GET.get("cursor"))
+    return render(request, "auctions/watchlist.html", {
+        "listings": [link.listing for link in page],
+        "page_obj": page,
+        "is_paginated": page.has_other_pages(),
+    })
 
 
 @login_required
 def new_auction(request):
     if request.method == "POST":
-        form = NewAuctionForm(request.POST)
+        form = NewAuctionForm(request.POST, request.FILES)
         if form.is_valid():
             auction = form.save(commit=False)
             auction.user = request.user
             auction.current_price = auction.starting_bid
             auction.save()
+            if auction.image:
+                schedule_renditions(auction.pk)
             return HttpResponseRedirect(reverse("index"))
     else:
         form = NewAuctionForm()
     return render(request, "auctions/new_auction.html", {"form": form})
 
 
+@cache_anonymous_page(lambda request, pk: [listing_tag(pk)])
 def auction_view(request, pk):
-    auction = get_object_or_404(Listing, pk=pk)
+    auction = get_object_or_404(Listing.objects.select_related("category", "user", "top_bidder"), pk=pk)
     favoured = False
-    increment = Decimal("0.01")
-    minimum_bid = auction.current_price + increment
-    bid_form = BidForm(initial={"amount": minimum_bid}, auction=auction)
+    bid_form = BidForm(initial={"amount": minimum_bid(auction.current_price)}, auction=auction)
+    proxy_form = ProxyBidForm(auction=auction)
     comment_form = CommentForm()
+    my_maximum = None
 
     if request.user.is_authenticated:
-        favoured = auction.favoured.filter(id=request.user.id).exists()
-
-    top_bid = auction.bids.order_by("-amount").first()
+        favoured = is_watching(request.user, auction.pk)
+        my_maximum = ProxyBid.objects.filter(auction=auction, user=request.user).values_list("max_amount", flat=True).first()
 
     if request.method == 'POST':
         if not request.user.is_authenticated:
@@ -129,23 +180,20 @@ def auction_view(request, pk):
         if 'bid' in request.POST:
             bid_form = BidForm(request.POST, auction=auction)
             if bid_form.is_valid():
-                temp = bid_form.save(commit=False)
-                temp.user = request.user
-                temp.auction = auction
-                temp.save()
-
-                # update the price
-                auction.current_price = temp.amount
-                auction.save()
-                return redirect("auction_view", pk=auction.pk)
-
-            elif 'comment' in request.POST:
-                comment_form = CommentForm(request.POST)
-                if comment_form.is_valid():
-                    temp = comment_form.save(commit=False)
-                    temp.user = request.user
-                    temp.auction = auction
-                    temp.save()
+                try:
+                    submit_bid(auction.pk, request.user, bid_form.cleaned_data["amount"])
+                except BidRejected as e:
+                    bid_form.add_error("amount", str(e))
+                else:
+                    return redirect("auction_view", pk=auction.pk)
+        if 'proxy' in request.POST:
+            proxy_form = ProxyBidForm(request.POST, auction=auction)
+            if proxy_form.is_valid():
+                try:
+                    set_proxy_bid(auction.pk, request.user, proxy_form.cleaned_data["max_amount"])
+                except BidRejected as e:
+                    proxy_form.add_error("max_amount", str(e))
+                else:
                     return redirect("auction_view", pk=auction.pk)
         if 'comment' in request.POST:
             comment_form = CommentForm(request.POST)
@@ -159,37 +207,129 @@ def auction_view(request, pk):
     return render(request, "auctions/auction_view.html", {
         "auction": auction,
         "bid_form": bid_form,
+        "proxy_form": proxy_form,
+        "my_maximum": my_maximum,
         "favoured": favoured,
-        "top_bid": top_bid,
         "comment_form": comment_form,
-        "comments": auction.comments.all().order_by("-created_on")
+        "comments": comments_page(auction.pk),
+        # live updates pick up after the last event this render already shows
+        "last_event_id": last_event_id(auction.pk),
     })
 
 
+@cache_anonymous_page(lambda request, pk: [listing_tag(pk)])
+def auction_comments(request, pk):
+    # the next page of comments as a bare fragment for "load more"
+    return render(request, "auctions/includes/comments.html", {
+        "auction_id": pk,
+        "comments": comments_page(pk, request.GET.get("cursor")),
+    })
+
+
+async def auction_events(request, pk):
+    # Server-Sent Events stream of bids and closure for one listing. needs an
+    # ASGI server (see commerce/asgi.py); under WSGI the client is told to
+    # fall back to auction_poll, since a WSGI worker cannot hold it open
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    # subscribed before the state is read, so an event published in between
+    # is still delivered after the snapshot rather than lost. events are
+    # published after their commit, so the state includes everything up to
+    # `seen` and those are not sent again
+    subscriber = hub.subscribe(pk)
+    seen = last_event_id(pk)
+    try:
+        state = await _live_state(pk)
+    except Http404:
+        hub.unsubscribe(pk, subscriber)
+        raise
+    response = StreamingHttpResponse(
+        _event_stream(pk, subscriber, snapshot_event(seen, state)),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def auction_poll(request, pk):
+    # long-poll fallback: answers straight away if something newer than
+    # ?since= has happened, otherwise waits for the next event
+    try:
+        since = int(request.GET.get("since", 0))
+    except ValueError:
+        since = 0
+    subscriber = hub.subscribe(pk)
+    try:
+        event = hub.latest(pk)
+        if event is None or event.id <= since:
+            if not await Listing.objects.filter(pk=pk).aexists():
+                raise Http404("No Listing matches the given query.")
+            try:
+                event = await subscriber.get(timeout=LONG_POLL_TIMEOUT)
+            except asyncio.TimeoutError:
+                return HttpResponse(status=204)
+    finally:
+        hub.unsubscribe(pk, subscriber)
+    return JsonResponse({"id": event.id, "type": event.type, "data": json.loads(event.data)})
+
+
+async def _live_state(pk):
+    state = await Listing.objects.filter(pk=pk).values(
+        "current_price", "bid_count", "is_active", "top_bidder__username"
+    ).afirst()
+    if state is None:
+        raise Http404("No Listing matches the given query.")
+    return {
+        "price": state["current_price"],
+        "bid_count": state["bid_count"],
+        "is_active": state["is_active"],
+        "bidder": state["top_bidder__username"],
+    }
+
+
+async def _event_stream(pk, subscriber, snapshot):
+    try:
+        yield snapshot.sse
+        while True:
+            try:
+                event = await subscriber.get(timeout=SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # keeps proxies from timing the connection out
+                yield b": keep-alive\n\n"
+                continue
+            if event.id > snapshot.id:
+                yield event.sse
+    finally:
+        hub.unsubscribe(pk, subscriber)
+
+
 @login_required
 def end_auction(request, pk):
-    auction = get_object_or_404(Listing, pk=pk)
-    if request.user.is_authenticated and request.user == auction.user:
-        # Get the highest bid to determine the winner
-        highest_bid = auction.bids.order_by("-amount").first()
-        if highest_bid:
-            auction.winner = highest_bid.user
-        
-        auction.is_active = False
-        auction.save()
+    auction = get_object_or_404(Listing.objects.only("id", "user_id"), pk=pk)
+    if auction.user_id == request.user.pk:
+        with transaction.atomic():
+            # the leading bidder wins. one conditional UPDATE, like
+            # close_expired_auctions, so a bid committing meanwhile cannot
+            # leave the winner behind the top bidder
+            closed = Listing.objects.filter(pk=pk, is_active=True).update(
+                is_active=False, winner=F("top_bidder"), version=F("version") + 1,
+            )
+            if closed:
+                winner = Listing.objects.filter(pk=pk).values_list("winner__username", flat=True).get()
+                purge_listing(pk)
+                transaction.on_commit(partial(publish_closed, pk, winner))
         messages.success(request, "Auction closed successfully!")
     return HttpResponseRedirect(reverse("auction_view", args=[pk]))
 
 
 @login_required
 def add_to_watchlist(request, pk):
-    listing = get_object_or_404(Listing, pk=pk)
-    if listing.favoured.filter(id=request.user.id).exists():
-        listing.favoured.remove(request.user)
-        messages.info(request, "Removed from watchlist")
-    else:
-        listing.favoured.add(request.user)
+    listing = get_object_or_404(Listing.objects.only("id"), pk=pk)
+    if toggle_watch(request.user, listing):
         messages.info(request, "Added to watchlist")
+    else:
+        messages.info(request, "Removed from watchlist")
     return HttpResponseRedirect(reverse("auction_view", args=[pk]))
 
 
@@ -200,11 +340,40 @@ def categories_processors(request):
     }
 
 
+def search(request):
+    form = SearchForm(request.GET)
+    page = None
+    if form.is_valid() and form.cleaned_data["q"]:
+        page = search_listings(
+            form.cleaned_data["q"],
+            cursor=request.GET.get("cursor"),
+            category=form.cleaned_data["category"],
+            include_closed=form.cleaned_data["include_closed"],
+        )
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    return render(request, "auctions/search.html", {
+        "form": form,
+        "listings": page or [],
+        "page_obj": page,
+        "is_paginated": page is not None and page.has_other_pages(),
+        "pagination_query": params.urlencode(),
+        "watched_ids": watched_ids(request.user, [l.id for l in page or []]),
+    })
+
+
 class CategoriesView(ListView):
     template_name = "auctions/categories.html"
     model = Category
     context_object_name = "categories"
 
+    def get_queryset(self):
+        # one grouped query, answered from the category+is_active index
+        return Category.objects.annotate(
+            listing_count=Count("listings"),
+            active_listing_count=Count("listings", filter=Q(listings__is_active=True)),
+        ).order_by("name")
+
 
 def category_listings(request, slug):
     # show the products under  a certain category
@@ -214,3 +383,19 @@ def category_listings(request, slug):
     return render(request, "auctions/category_listings.html", {
         "category": category
     })
+
+
+def metrics(request):
+    # scraped by Prometheus from inside the network, or looked at by staff
+    if request.META.get("REMOTE_ADDR") not in settings.AUCTIONS_METRICS_IPS and not request.user.is_staff:
+        raise Http404
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def media(request, path):
+    # only used when Django serves MEDIA_ROOT itself (AUCTIONS_SERVE_MEDIA)
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if path.startswith(f"{RENDITIONS_DIR}/"):
+        # renditions are named after their content and never change
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
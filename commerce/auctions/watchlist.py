@@ -0,0 +1,51 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Listing
+
+
+Favoured = Listing.favoured.through
+
+# enough to draw a card, nothing else
+CARD_FIELDS = [
+    "id", "title", "image_url", "current_price",
+    "image", "thumbnail", "thumbnail_width", "thumbnail_height",
+]
+
+
+def watched_ids(user, listing_ids):
+    # which of these listings does the user watch, in one query
+    if not user.is_authenticated:
+        return frozenset()
+    return frozenset(
+        Favoured.objects.filter(user=user, listing_id__in=list(listing_ids)).values_list("listing_id", flat=True)
+    )
+
+
+def is_watching(user, listing_id):
+    return listing_id in watched_ids(user, [listing_id])
+
+
+def toggle_watch(user, listing):
+    if is_watching(user, listing.pk):
+        listing.favoured.remove(user)
+        return False
+    listing.favoured.add(user)
+    return True
+
+
+def watchlist_for(user):
+    # the user's links to the listings they watch, to be paged on the link
+    # id (most recently watched first): the user_id index walks the links
+    # in that order, where paging on the listing id sorted the whole
+    # watchlist for every page
+    return Favoured.objects.filter(user=user).select_related("listing").only(
+        *(f"listing__{field}" for field in CARD_FIELDS)
+    )
+
+
+def recount_watchers(listings=None):
+    # rebuild watcher_count from the link table, for bulk loads that bypass signals
+    listings = Listing.objects.all() if listings is None else listings
+    watchers = Favoured.objects.filter(listing=OuterRef("pk")).values("listing").annotate(n=Count("id")).values("n")
+    listings.update(watcher_count=Coalesce(Subquery(watchers), 0))
@@ -3,6 +3,10 @@ ASGI config for commerce project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Live bid updates (auction_events) only stream under an ASGI server, e.g.
+``uvicorn commerce.asgi:application``; under WSGI pages fall back to
+long-polling.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'auctions.middleware.MetricsMiddleware',
+    'auctions.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,15 +83,111 @@ WSGI_APPLICATION = 'commerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# Run on every new SQLite connection. WAL lets reads carry on while a bid
+# commits, and with it synchronous=NORMAL can only lose the last commits on
+# a power cut, never corrupt the file. mmap and the page cache (in KiB when
+# negative) are per connection. `manage.py bench_sqlite` compares this
+# against the stock settings.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-32000')),
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # keep connections open across requests, each one pays for the
+        # pragmas and a cold page cache when it opens
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # take the write lock when the transaction starts so concurrent
+            # bids queue on the busy timeout instead of failing with
+            # "database is locked" on lock upgrade
+            'transaction_mode': 'IMMEDIATE',
+            # the busy timeout, in seconds
+            'timeout': 20,
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+        'TEST': {
+            # shared-cache in-memory databases ignore the busy timeout, so the
+            # concurrent bidding tests need a real file
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
     }
 }
 
+# Read replicas
+# Comma-separated SQLite files that serve the reads of web requests, see
+# auctions/replicas.py. Writes, transactions, management commands and a
+# user's requests for a few seconds after they write stay on the primary.
+# Locally `manage.py sync_replicas` keeps the files copied from the primary.
+AUCTIONS_REPLICA_FILES = [path for path in os.getenv('AUCTIONS_REPLICA_FILES', '').split(',') if path]
+AUCTIONS_READ_REPLICAS = []
+for number, path in enumerate(AUCTIONS_REPLICA_FILES, 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    AUCTIONS_READ_REPLICAS.append(f'replica{number}')
+AUCTIONS_PRIMARY_STICKY_SECONDS = int(os.getenv('AUCTIONS_PRIMARY_STICKY_SECONDS', '5'))
+DATABASE_ROUTERS = ['auctions.replicas.ReplicaRouter']
+
 AUTH_USER_MODEL = 'auctions.User'
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Cache versions (e.g. the category registry) are shared through this backend,
+# so with more than one worker process point it at memcached or redis.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Fragment caching
+# Listing cards and the static half of the auction page are cached per
+# (listing id, version), see auctions/fragments.py.
+
+AUCTIONS_FRAGMENT_CACHE = os.getenv('AUCTIONS_FRAGMENT_CACHE', 'True') == 'True'
+
+AUCTIONS_FRAGMENT_TIMEOUT = 60 * 60
+
+# Anonymous page cache
+# Logged-out GETs of the index, category and auction pages are served from
+# the cache and purged when a listing is bid on, commented on, closed or
+# created, see auctions/page_cache.py. The timeout bounds everything else
+# (time left, watcher counts).
+
+AUCTIONS_PAGE_CACHE = os.getenv('AUCTIONS_PAGE_CACHE', 'True') == 'True'
+
+AUCTIONS_PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Metrics
+# Per-view latency, query and template histograms on /metrics (Prometheus text
+# format), readable from these addresses or by staff. Requests issuing more
+# queries than the budget are logged to the auctions.metrics logger.
+
+AUCTIONS_METRICS_IPS = ['127.0.0.1', '::1']
+
+AUCTIONS_QUERY_BUDGET = 20
+
+# Bidding
+# Route bids through the per-listing single-writer sequencer (auctions/sequencer.py)
+# instead of one transaction per bid. Worth it for hot listings near closing time.
+
+AUCTIONS_BID_SEQUENCER = os.getenv('AUCTIONS_BID_SEQUENCER', 'False') == 'True'
+
+AUCTIONS_BID_SEQUENCER_SHARDS = 4
+
+AUCTIONS_BID_SEQUENCER_BATCH_SIZE = 50
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -127,3 +225,26 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# Uploaded images
+# Originals go under MEDIA_ROOT/originals. A pool of worker processes makes
+# a cropped card thumbnail and a detail rendition of each, see
+# auctions/images.py. 0 workers renders inline instead. Renditions are named
+# after their content and, when Django serves the media itself, sent with a
+# one-year cache lifetime.
+
+MEDIA_URL = '/media/'
+
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+AUCTIONS_SERVE_MEDIA = os.getenv('AUCTIONS_SERVE_MEDIA', str(DEBUG)) == 'True'
+
+AUCTIONS_IMAGE_WORKERS = int(os.getenv('AUCTIONS_IMAGE_WORKERS', '2'))
+
+AUCTIONS_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+AUCTIONS_THUMBNAIL_SIZE = (480, 320)
+
+AUCTIONS_DETAIL_SIZE = (1200, 1200)
+
+AUCTIONS_IMAGE_QUALITY = 80